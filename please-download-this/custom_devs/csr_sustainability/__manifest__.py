@@ -14,16 +14,22 @@
         'views/purchase_activity_wizard_views.xml',
         'views/activity_views.xml',
         'views/activity_purchase_views.xml',
+        'views/points_ledger_views.xml',
+        'views/purchase_history_views.xml',
         'views/project_search.xml',
         'views/join_project_wizard_views.xml',
+        'views/complete_project_wizard_views.xml',
         'views/project_views.xml',
         'views/employee_views.xml',
         'views/leaderboard_views.xml',
         'views/ngo_views.xml',
+        'views/route_stats_views.xml',
+        'views/res_config_settings_views.xml',
         'views/menu.xml',
         'views/portal_project_templates.xml',
         'views/portal_activity_templates.xml',
         'data/project_data.xml',
+        'data/ir_cron_data.xml',
     ],
     'application': True,
 }
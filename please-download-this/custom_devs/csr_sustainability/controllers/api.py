@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from odoo import _, http
+from odoo.exceptions import AccessError, UserError
+from odoo.http import request
+
+from .profiling import profiled
+from .replica import remember_write, replica_readonly
+
+# Fields the API exposes, per model; ``fields`` selects a subset of them
+API_FIELDS = {
+    'project.project': (
+        'name', 'description', 'date_start', 'date', 'active', 'xp', 'ngo_id', 'project_status',
+        'participant_count', 'completion_count', 'completion_ratio',
+    ),
+    'csr.activity': ('name', 'description', 'xp', 'value', 'active', 'ngo_id', 'purchase_count'),
+    'csr.activity.purchase': ('activity_id', 'employee_id', 'ngo_id', 'purchase_date', 'xp_paid', 'o2_received'),
+    'hr.employee': ('name', 'sustainability_points', 'money_O2', 'leaderboard_rank', 'badge', 'activity_purchase_count'),
+}
+
+# Fields returned when the client does not select any
+API_DEFAULT_FIELDS = {
+    'project.project': ('name', 'date_start', 'date', 'xp', 'ngo_id', 'project_status'),
+    'csr.activity': ('name', 'xp', 'value', 'ngo_id'),
+    'csr.activity.purchase': ('activity_id', 'purchase_date', 'xp_paid', 'o2_received'),
+    'hr.employee': ('sustainability_points', 'money_O2', 'leaderboard_rank', 'badge'),
+}
+
+# Most records returned by one list call
+API_MAX_LIMIT = 200
+
+
+def _is_integer(value):
+    # JSON booleans are Python integers too
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class CSRApi(http.Controller):
+    """Version 1 of the JSON-RPC API of the sustainability portal, for the
+    mobile app and the kiosks.
+
+    The routes apply the access rules of the portal pages: NGO users get
+    their own projects, activities and the purchases of their activities,
+    employees the projects they take part in, the active activities and
+    their own purchases and balance. List routes take ``fields`` (a subset
+    of ``API_FIELDS``), ``ids`` to read several given records in one call,
+    and ``limit``/``offset`` otherwise.
+    """
+
+    def _get_identity(self):
+        """Return the ``(ngo, employee)`` of the current user, refusing the
+        users who are neither"""
+        ngo, employee = request.env.user._get_csr_identity()
+        if not ngo and not employee:
+            raise AccessError(_('No NGO or employee account found. Please contact your administrator.'))
+        return ngo, employee
+
+    def _check_fields(self, model, field_names):
+        if not field_names:
+            return list(API_DEFAULT_FIELDS[model])
+        if not isinstance(field_names, list) or not all(isinstance(name, str) for name in field_names):
+            raise UserError(_('fields must be a list of field names.'))
+        if unknown := set(field_names) - set(API_FIELDS[model]):
+            raise UserError(_('Unknown fields: %s', ', '.join(sorted(unknown))))
+        return list(field_names)
+
+    def _check_ids(self, ids, name):
+        """Return ``ids``, the record ids sent as the ``name`` parameter, if
+        they are a list of positive integers"""
+        if not isinstance(ids, list) or not all(_is_integer(record_id) and record_id > 0 for record_id in ids):
+            raise UserError(_('%s must be a list of record ids.', name))
+        return ids
+
+    def _check_integer(self, value, name):
+        if not _is_integer(value):
+            raise UserError(_('%s must be an integer.', name))
+        return value
+
+    def _read(self, model, domain, field_names, ids=None, limit=80, offset=0, order='id desc'):
+        """Return ``{'count', 'records'}`` for the records of ``model``
+        matching ``domain``: the given ``ids`` or one page of them. The
+        records are read with one query per model they refer to."""
+        field_names = self._check_fields(model, field_names)
+        Model = request.env[model].sudo()
+        if ids is not None:
+            domain = domain + [('id', 'in', self._check_ids(ids, 'ids'))]
+            limit, offset = None, 0
+        else:
+            limit = max(1, min(self._check_integer(limit, 'limit'), API_MAX_LIMIT))
+            offset = max(0, self._check_integer(offset, 'offset'))
+        records = Model.search_fetch(domain, field_names, limit=limit, offset=offset, order=order)
+        if ids is not None:
+            count = len(records)
+        elif offset or len(records) == limit:
+            count = Model.search_count(domain)
+        else:
+            count = len(records)
+        return {'count': count, 'records': records.read(field_names)}
+
+    # ------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------
+
+    @http.route('/csr/api/v1/projects', type='jsonrpc', auth='user', readonly=replica_readonly)
+    @profiled
+    def api_projects(self, fields=None, ids=None, limit=80, offset=0, **kw):
+        ngo, employee = self._get_identity()
+        if ngo:
+            domain = [('is_sustainability', '=', True), ('ngo_id', '=', ngo.id)]
+        else:
+            domain = [('is_sustainability', '=', True), ('employee_ids', 'in', employee.ids)]
+        return self._read('project.project', domain, fields, ids, limit, offset)
+
+    @http.route('/csr/api/v1/activities', type='jsonrpc', auth='user', readonly=replica_readonly)
+    @profiled
+    def api_activities(self, fields=None, ids=None, limit=80, offset=0, **kw):
+        ngo, employee = self._get_identity()
+        if ngo:
+            domain = [('ngo_id', '=', ngo.id)]
+        else:
+            domain = [('active', '=', True)]
+        return self._read('csr.activity', domain, fields, ids, limit, offset)
+
+    @http.route('/csr/api/v1/purchases', type='jsonrpc', auth='user', readonly=replica_readonly)
+    @profiled
+    def api_purchases(self, fields=None, ids=None, limit=80, offset=0, **kw):
+        """Purchase history, newest first"""
+        ngo, employee = self._get_identity()
+        if ngo:
+            domain = [('ngo_id', '=', ngo.id)]
+        else:
+            domain = [('employee_id', '=', employee.id)]
+        return self._read('csr.activity.purchase', domain, fields, ids, limit, offset,
+                          order='purchase_date desc, id desc')
+
+    @http.route('/csr/api/v1/balance', type='jsonrpc', auth='user', readonly=replica_readonly)
+    @profiled
+    def api_balance(self, fields=None, **kw):
+        """XP and O2 balances of the current employee"""
+        employee = self._get_identity()[1]
+        if not employee:
+            raise AccessError(_('Only employees have a balance.'))
+        return self._read('hr.employee', [('id', '=', employee.id)], fields, [employee.id])['records'][0]
+
+    # ------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------
+
+    @http.route('/csr/api/v1/activities/purchase', type='jsonrpc', auth='user', methods=['POST'])
+    @profiled
+    def api_purchase(self, activity_ids, **kw):
+        """Purchase activities for the current employee.
+
+        :return: one ``{'activity_id', 'success', 'purchase_id' | 'error'}``
+            per activity, in the same order
+        """
+        employee = self._get_identity()[1]
+        if not employee:
+            raise AccessError(_('Only employees can purchase activities.'))
+        results = request.env['csr.activity.purchase'].sudo()._purchase_batch(
+            [(employee.id, activity_id) for activity_id in self._check_ids(activity_ids, 'activity_ids')]
+        )
+        remember_write()
+        for result in results:
+            del result['employee_id']
+        return results
+
+    @http.route('/csr/api/v1/projects/<int:project_id>/complete', type='jsonrpc', auth='user', methods=['POST'])
+    @profiled
+    def api_complete(self, project_id, employee_ids=None, **kw):
+        """Mark a project as done: for the current employee, or, for the NGO
+        owning the project, for the given participants.
+
+        :return: ``{'employee_ids', 'queued'}``, the employees the project
+            was completed for and whether their XP is left to the award queue
+        """
+        ngo, employee = self._get_identity()
+        project = request.env['project.project'].sudo().browse(project_id)
+        if not project.exists() or not project.is_sustainability:
+            raise UserError(_('This project does not exist.'))
+        if ngo:
+            if project.ngo_id != ngo:
+                raise AccessError(_('You can only complete your own projects.'))
+            employees = request.env['hr.employee'].sudo().browse(self._check_ids(employee_ids or [], 'employee_ids'))
+        else:
+            employees = employee
+        # non-members and employees who already completed the project are skipped
+        completed = project._complete_for_employees(employees)
+        remember_write()
+        return {'employee_ids': completed.ids, 'queued': request.env['csr.award.queue']._is_enabled()}
@@ -1,26 +1,181 @@
 # -*- coding: utf-8 -*-
-from odoo import http
-from odoo.http import request
+import csv
+import hashlib
+import io
+from contextlib import contextmanager
+from datetime import timedelta
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.http import is_resource_modified
+
+from odoo import _, fields, http
+from odoo.exceptions import AccessError, UserError
+from odoo.http import content_disposition, request
+from odoo.tools import SQL
 from odoo.addons.portal.controllers import portal
 
+from ..models.activity import CATALOGUE_CACHE
+from ..models.employee import LEADERBOARD_TOP_SIZE
+from ..models.ngo_import import IMPORT_COLUMNS
+from .profiling import profiled
+from .replica import remember_write, replica_readonly
+
+# Active tasks shown per page on the portal page of a project
+TASKS_PER_PAGE = 20
+
+# Counters of the portal home, see ``ProjectPortal._get_csr_counters``
+CSR_COUNTERS = ('activity_count', 'csr_project_count', 'csr_completed_project_count', 'csr_purchase_count', 'csr_xp_balance')
+
+# Periods, in days, the NGO impact dashboard can show the daily totals for
+IMPACT_PERIODS = ('7', '30', '90')
+
+
+@contextmanager
+def _server_side_cursor(cr, name):
+    """Open a server-side (named) psycopg2 cursor in the transaction of the
+    Odoo cursor ``cr``, and close it on exit.
+
+    Odoo cursors fetch the whole result of a query; a named cursor fetches
+    it from the server as it is read. Odoo has no API for it, hence the
+    direct use of the connection of ``cr``: queries run through it are not
+    logged nor counted, and it must be closed before ``cr``.
+    """
+    cursor = cr._cnx.cursor(name)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+def _stream_csv(registry, query, header, batch_size=2000):
+    """Yield the CSV export of ``query``, ``batch_size`` rows at a time.
+
+    The rows are read through a server-side (named) cursor opened on a
+    read-only cursor of its own (on the replica if there is one), as the
+    response is sent after the request cursor is closed: neither the
+    database client nor this generator ever hold more than one batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode()
+    with registry.cursor(readonly=True) as cr, _server_side_cursor(cr, 'csr_history_export') as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query.code, query.params)
+        while rows := cursor.fetchmany(batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+
+
+def _parse_amount(value):
+    """Return the non-negative number typed in a portal filter, or ``None``"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if amount >= 0 else None
+
+
+def _parse_limit(limit):
+    """Return the ``limit`` of a leaderboard request, between 1 and the size
+    of the cached top, or reject the request"""
+    try:
+        return max(1, min(int(limit), LEADERBOARD_TOP_SIZE))
+    except ValueError:
+        raise BadRequest(_('The limit must be a number.'))
+
 
 class ProjectPortal(portal.CustomerPortal):
     _items_per_page = 80
 
+    def _get_csr_identity(self):
+        """Return the ``(ngo, employee)`` of the current user.
+
+        The lookup is done once per request on top of the per-user cache of
+        ``res.users._get_csr_identity_ids``.
+        """
+        identities = getattr(request, '_csr_identities', None)
+        if identities is None:
+            identities = request._csr_identities = {}
+        if request.env.uid not in identities:
+            identities[request.env.uid] = request.env.user._get_csr_identity()
+        return identities[request.env.uid]
+
+    def _get_search_values(self, search):
+        """Return the domain matching ``search`` on the name, description or
+        NGO name of activities and projects (all fields trigram-indexed), and
+        the values of the portal search bar."""
+        domain = ['|', '|', ('name', 'ilike', search), ('description', 'ilike', search), ('ngo_id.name', 'ilike', search)] if search else []
+        return domain, {
+            'search': search,
+            'search_in': 'all',
+            'searchbar_inputs': {'all': {'input': 'all', 'label': _('Search in Name, Description and NGO'), 'sequence': 10}},
+        }
+
+    def _get_csr_counters(self):
+        """Return the portal home counters of the current user: activities,
+        projects, completed projects, purchases and available XP.
+
+        They are computed by one query per user type and kept for the rest of
+        the request, for the layout and the home counters alike.
+        """
+        counters = getattr(request, '_csr_counters', None)
+        if counters is None:
+            counters = request._csr_counters = {}
+        if request.env.uid in counters:
+            return counters[request.env.uid]
+
+        ngo, employee = self._get_csr_identity()
+        values = dict.fromkeys(CSR_COUNTERS, 0)
+        if ngo:
+            request.env['csr.activity'].flush_model(['ngo_id', 'active', 'purchase_count'])
+            request.env['project.project'].flush_model(['ngo_id', 'is_sustainability', 'project_status'])
+            request.env.cr.execute(SQL("""
+                SELECT COUNT(*) FILTER (WHERE kind = 'activity' AND active),
+                       COUNT(*) FILTER (WHERE kind = 'project'),
+                       COUNT(*) FILTER (WHERE kind = 'project' AND done),
+                       COALESCE(SUM(purchase_count), 0)
+                  FROM (
+                        SELECT 'activity' AS kind, active, FALSE AS done, purchase_count
+                          FROM csr_activity
+                         WHERE ngo_id = %(ngo_id)s
+                     UNION ALL
+                        SELECT 'project', TRUE, project_status = 'done', 0
+                          FROM project_project
+                         WHERE ngo_id = %(ngo_id)s AND is_sustainability
+                       ) records
+            """, ngo_id=ngo.id))
+            (values['activity_count'], values['csr_project_count'],
+             values['csr_completed_project_count'], values['csr_purchase_count']) = request.env.cr.fetchone()
+        elif employee:
+            request.env['hr.employee'].flush_model(['sustainability_points', 'activity_purchase_count'])
+            request.env['project.project'].flush_model(['is_sustainability', 'employee_ids', 'completed_by_employee_ids'])
+            request.env.cr.execute(SQL("""
+                SELECT COUNT(project.id),
+                       COUNT(completion.project_id),
+                       MAX(employee.activity_purchase_count),
+                       MAX(COALESCE(employee.sustainability_points, 0))
+                  FROM hr_employee employee
+             LEFT JOIN hr_employee_project_project_rel member ON member.hr_employee_id = employee.id
+             LEFT JOIN project_project project ON project.id = member.project_project_id AND project.is_sustainability
+             LEFT JOIN project_employee_completion_rel completion
+                       ON completion.project_id = project.id AND completion.employee_id = employee.id
+                 WHERE employee.id = %s
+            """, employee.id))
+            (values['csr_project_count'], values['csr_completed_project_count'],
+             values['csr_purchase_count'], values['csr_xp_balance']) = request.env.cr.fetchone()
+        counters[request.env.uid] = values
+        return values
+
     def _prepare_portal_layout_values(self):
         values = super(ProjectPortal, self)._prepare_portal_layout_values()
         # Add activity count and NGO info for portal home - check if user is linked to NGO
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        
+        ngo, employee = self._get_csr_identity()
+        values['has_ngo'] = bool(ngo)
         if ngo:
-            activity_count = request.env['csr.activity'].sudo().search_count([
-                ('ngo_id', '=', ngo.id)
-            ])
-            values['activity_count'] = activity_count
-            values['has_ngo'] = True
-        else:
-            values['has_ngo'] = False
+            values['activity_count'] = self._get_csr_counters()['activity_count']
         
         # Show activities button to both NGOs and employees
         values['show_activities'] = bool(ngo or employee)
@@ -29,29 +184,25 @@ class ProjectPortal(portal.CustomerPortal):
     def _prepare_home_portal_values(self, counters):
         values = super(ProjectPortal, self)._prepare_home_portal_values(counters)
         # Check if user is linked to NGO
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        
-        if ngo:
-            values['has_ngo'] = True
-            # Compute activity_count if requested in counters or if counters is empty (initial load)
-            if not counters or 'activity_count' in counters:
-                activity_count = request.env['csr.activity'].sudo().search_count([
-                    ('ngo_id', '=', ngo.id)
-                ])
-                values['activity_count'] = int(activity_count) if activity_count else 0
-        else:
-            values['has_ngo'] = False
-            if not counters or 'activity_count' in counters:
-                values['activity_count'] = 0
+        ngo, employee = self._get_csr_identity()
+        values['has_ngo'] = bool(ngo)
+        
+        # Compute the counters requested, or all of them if counters is empty (initial load)
+        if not counters or set(counters) & set(CSR_COUNTERS):
+            values.update({
+                counter: value
+                for counter, value in self._get_csr_counters().items()
+                if not counters or counter in counters
+            })
         
         # Show activities button to both NGOs and employees
         values['show_activities'] = bool(ngo or employee)
         return values
     @http.route(['/my/projects/new'], type='http', auth="user", website=True, methods=['GET', 'POST'])
+    @profiled
     def portal_my_projects_new(self, **kw):
         """Create a new sustainability project"""
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo = self._get_csr_identity()[0]
         if not ngo:
             return request.redirect('/my/home')
 
@@ -68,6 +219,7 @@ class ProjectPortal(portal.CustomerPortal):
             # Remove empty values but keep xp
             vals = {k: v for k, v in vals.items() if v or k == 'xp'}
             project = request.env['project.project'].sudo().create(vals)
+            remember_write()
             return request.redirect(f'/my/projects/{project.id}')
 
         values = {
@@ -78,9 +230,10 @@ class ProjectPortal(portal.CustomerPortal):
         return request.render("csr_sustainability.portal_project_new", values)
 
     @http.route(['/my/projects/<int:project_id>/edit'], type='http', auth="user", website=True, methods=['GET', 'POST'])
+    @profiled
     def portal_my_projects_edit(self, project_id=None, **kw):
         """Edit a sustainability project"""
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo = self._get_csr_identity()[0]
         if not ngo:
             return request.redirect('/my/home')
         
@@ -106,6 +259,7 @@ class ProjectPortal(portal.CustomerPortal):
             # Remove empty values but keep description and xp
             vals = {k: v for k, v in vals.items() if v is not False or k in ['description', 'xp']}
             project.write(vals)
+            remember_write()
             return request.redirect(f'/my/projects/{project.id}')
         
         values = {
@@ -116,33 +270,48 @@ class ProjectPortal(portal.CustomerPortal):
         return request.render("csr_sustainability.portal_project_edit", values)
 
 
-    @http.route(['/my/projects', '/my/projects/page/<int:page>'], type='http', auth="user", website=True)
-    def portal_my_projects(self, page=1, **kw):
+    @http.route(['/my/<any(activities,projects):kind>/import'], type='http', auth="user", website=True, methods=['GET', 'POST'])
+    @profiled
+    def portal_ngo_import(self, kind, **kw):
+        """Create activities or projects from an uploaded CSV/XLSX file"""
+        ngo = self._get_csr_identity()[0]
+        if not ngo:
+            return request.redirect('/my/home')
+
+        values = {
+            'page_name': 'activity' if kind == 'activities' else 'project',
+            'default_url': f'/my/{kind}/import',
+            'ngo': ngo,
+            'kind': kind,
+            'columns': IMPORT_COLUMNS[kind],
+        }
+        upload = request.httprequest.files.get('file')
+        if request.httprequest.method == 'POST' and upload:
+            try:
+                values['report'] = request.env['csr.ngo.import']._import(ngo, kind, upload.stream, upload.filename or '')
+                remember_write()
+            except UserError as error:
+                values['error_message'] = error.args[0]
+        return request.render("csr_sustainability.portal_ngo_import", values)
+
+    @http.route(['/my/projects', '/my/projects/page/<int:page>'], type='http', auth="user", website=True, readonly=replica_readonly)
+    @profiled
+    def portal_my_projects(self, page=1, search=None, **kw):
         """Display list of sustainability projects for NGO users or employees"""
         # Check if user is NGO or employee
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo, employee = self._get_csr_identity()
+        search = (search or '').strip()
+        search_domain, search_values = self._get_search_values(search)
         
         # Use sudo to bypass record rules for portal users
         Project = request.env['project.project'].sudo()
         
         if ngo:
             # NGO users see their own projects
-            domain = [('is_sustainability', '=', True), ('ngo_id', '=', ngo.id)]
-            project_count = Project.search_count(domain)
-            offset = (page - 1) * self._items_per_page
-            projects = Project.search(domain, limit=self._items_per_page, offset=offset, order='id desc')
+            domain = [('is_sustainability', '=', True), ('ngo_id', '=', ngo.id)] + search_domain
         elif employee:
             # Employee users see projects they're part of
-            # First, get all sustainability projects
-            all_projects = Project.search([('is_sustainability', '=', True)])
-            # Filter to only projects where this employee is a member
-            employee_projects = all_projects.filtered(lambda p: employee.id in p.employee_ids.ids)
-            
-            project_count = len(employee_projects)
-            offset = (page - 1) * self._items_per_page
-            # Sort by ID descending and apply pagination
-            projects = sorted(employee_projects, key=lambda p: p.id, reverse=True)[offset:offset + self._items_per_page]
+            domain = [('is_sustainability', '=', True), ('employee_ids', 'in', employee.ids)] + search_domain
         else:
             # No NGO or employee found
             values = {
@@ -154,10 +323,13 @@ class ProjectPortal(portal.CustomerPortal):
             }
             return request.render("csr_sustainability.portal_my_projects", values)
         
+        project_count = Project.search_count(domain)
+        projects = self._prepare_project_rows(domain, (page - 1) * self._items_per_page)
+        
         # Paging
         pager = request.website.pager(
             url="/my/projects",
-            url_args={},
+            url_args={'search': search} if search else {},
             total=project_count,
             page=page,
             step=self._items_per_page
@@ -171,16 +343,67 @@ class ProjectPortal(portal.CustomerPortal):
             'ngo': ngo,
             'employee': employee,
             'project_count': project_count,
+            **search_values,
         }
         
         return request.render("csr_sustainability.portal_my_projects", values)
 
-    @http.route(['/my/projects/<int:project_id>'], type='http', auth="user", website=True)
-    def portal_project_page(self, project_id=None, access_token=None, **kw):
-        """Display a single sustainability project"""
+    def _prepare_project_rows(self, domain, offset):
+        """Return a page of the projects matching ``domain`` as the rows of
+        ``portal_my_projects``, read with one query for the projects and one
+        grouped query for their task counts however many rows there are"""
+        projects = request.env['project.project'].sudo().search_fetch(
+            domain, ['name', 'date_start', 'date', 'active', 'xp'],
+            limit=self._items_per_page, offset=offset, order='id desc',
+        )
+        task_counts = dict(request.env['project.task'].sudo()._read_group(
+            [('project_id', 'in', projects.ids)], ['project_id'], ['__count'],
+        ))
+        return [{
+            'id': project.id,
+            'name': project.name,
+            'url': f'/my/projects/{project.id}',
+            'date_start': project.date_start,
+            'date': project.date,
+            'active': project.active,
+            'xp': project.xp,
+            'task_count': task_counts.get(project, 0),
+        } for project in projects]
+
+    def _get_pending_participants(self, project):
+        """Return the participants of ``project`` who did not complete it, as
+        ``{'id', 'name'}`` rows read with one query. Completions still in the
+        award queue are not pending anymore."""
+        request.env['project.project'].flush_model(['employee_ids', 'completed_by_employee_ids'])
+        request.env.cr.execute(SQL("""
+            SELECT employee.id, employee.name
+              FROM hr_employee_project_project_rel member
+              JOIN hr_employee employee ON employee.id = member.hr_employee_id
+             WHERE member.project_project_id = %(project_id)s
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM project_employee_completion_rel completion
+                     WHERE completion.project_id = member.project_project_id
+                       AND completion.employee_id = member.hr_employee_id
+               )
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM csr_award_queue award
+                     WHERE award.project_id = member.project_project_id
+                       AND award.employee_id = member.hr_employee_id
+               )
+          ORDER BY employee.name, employee.id
+        """, project_id=project.id))
+        return [{'id': employee_id, 'name': name} for employee_id, name in request.env.cr.fetchall()]
+
+    @http.route(['/my/projects/<int:project_id>', '/my/projects/<int:project_id>/tasks',
+                 '/my/projects/<int:project_id>/tasks/page/<int:task_page>'],
+                type='http', auth="user", website=True, readonly=replica_readonly)
+    @profiled
+    def portal_project_page(self, project_id=None, access_token=None, task_page=1, **kw):
+        """Display a single sustainability project, with a page of its active tasks"""
         # Check if user is NGO or employee
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo, employee = self._get_csr_identity()
         
         try:
             project_sudo = request.env['project.project'].sudo().browse(project_id)
@@ -188,21 +411,37 @@ class ProjectPortal(portal.CustomerPortal):
             return request.redirect('/my/projects')
         
         # Check access - NGO can see their projects, employees can see projects they're part of
+        is_completed = False
+        is_employee_in_project = False
         if ngo:
             if project_sudo.ngo_id != ngo or not project_sudo.is_sustainability:
                 return request.redirect('/my/projects')
         elif employee:
-            if not project_sudo.is_sustainability or employee not in project_sudo.employee_ids:
+            if not project_sudo.exists() or not project_sudo.is_sustainability:
+                return request.redirect('/my/projects')
+            is_employee_in_project, is_completed = project_sudo._get_employee_participation(employee)
+            if not is_employee_in_project:
                 return request.redirect('/my/projects')
         else:
             return request.redirect('/my/home')
         
-        # Check if employee has completed this project and if they're a member
-        is_completed = False
-        is_employee_in_project = False
-        if employee:
-            is_completed = employee.id in project_sudo.completed_by_employee_ids.ids
-            is_employee_in_project = employee.id in project_sudo.employee_ids.ids
+        # NGO owners can complete the project for the participants still pending
+        pending_employees = self._get_pending_participants(project_sudo) if ngo else []
+        
+        # Active tasks, one page at a time
+        Task = request.env['project.task'].sudo()
+        task_domain = [('project_id', '=', project_sudo.id)]
+        task_count = Task.search_count(task_domain)
+        task_pager = request.website.pager(
+            url=f'/my/projects/{project_sudo.id}/tasks',
+            total=task_count,
+            page=task_page,
+            step=TASKS_PER_PAGE,
+        )
+        tasks = Task.search_fetch(
+            task_domain, ['name', 'state', 'sustainability_points'],
+            limit=TASKS_PER_PAGE, offset=task_pager['offset'],
+        )
         
         values = {
             'project': project_sudo,
@@ -211,14 +450,23 @@ class ProjectPortal(portal.CustomerPortal):
             'employee': employee,
             'is_completed': is_completed,
             'is_employee_in_project': is_employee_in_project,
+            'pending_employees': pending_employees,
+            'tasks': [{
+                'name': task.name,
+                'state': task.state,
+                'sustainability_points': task.sustainability_points,
+            } for task in tasks],
+            'task_count': task_count,
+            'task_pager': task_pager,
         }
         
         return request.render("csr_sustainability.project_portal_template", values)
     
     @http.route(['/my/projects/<int:project_id>/mark_done'], type='http', auth="user", website=True, methods=['POST'])
+    @profiled
     def portal_project_mark_done(self, project_id=None, **kw):
         """Mark a project as done for the current employee"""
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        employee = self._get_csr_identity()[1]
         if not employee:
             return request.redirect('/my/home')
         
@@ -229,47 +477,57 @@ class ProjectPortal(portal.CustomerPortal):
         except:
             return request.redirect('/my/projects')
         
-        # Check if employee is part of the project
-        if employee not in project.employee_ids:
-            return request.redirect(f'/my/projects/{project_id}')
-        
-        # Check if already completed
-        if employee in project.completed_by_employee_ids:
+        # Only participants who did not complete the project yet can mark it as done
+        is_employee_in_project, is_completed = project._get_employee_participation(employee)
+        if not is_employee_in_project or is_completed:
             return request.redirect(f'/my/projects/{project_id}')
         
         # Mark as done and award XP
-        project.sudo().write({
-            'completed_by_employee_ids': [(4, employee.id)]
-        })
+        project._complete_for_employees(employee)
+        remember_write()
         
-        if project.xp > 0:
-            employee.sudo().write({
-                'sustainability_points': employee.sustainability_points + int(project.xp)
-            })
+        return request.redirect(f'/my/projects/{project_id}')
+
+    @http.route(['/my/projects/<int:project_id>/complete'], type='http', auth="user", website=True, methods=['POST'])
+    @profiled
+    def portal_project_complete_participants(self, project_id=None, **kw):
+        """Mark a project as done for the selected participants (NGO owner only)"""
+        ngo = self._get_csr_identity()[0]
+        if not ngo:
+            return request.redirect('/my/home')
+        
+        project = request.env['project.project'].sudo().browse(project_id)
+        if not project.exists() or not project.is_sustainability or project.ngo_id != ngo:
+            return request.redirect('/my/projects')
+        
+        employee_ids = [int(employee_id) for employee_id in request.httprequest.form.getlist('employee_ids') if employee_id.isdigit()]
+        project._complete_for_employees(request.env['hr.employee'].sudo().browse(employee_ids))
+        remember_write()
         
         return request.redirect(f'/my/projects/{project_id}')
 
-    @http.route(['/my/activities', '/my/activities/page/<int:page>'], type='http', auth="user", website=True)
-    def portal_my_activities(self, page=1, **kw):
+    @http.route(['/my/activities', '/my/activities/page/<int:page>'], type='http', auth="user", website=True, readonly=replica_readonly)
+    @profiled
+    def portal_my_activities(self, page=1, search=None, sortby=None, filterby=None, ngo_id=None,
+                             value_min=None, value_max=None, **kw):
         """Display list of activities for NGO users or all activities for employees"""
         # Check if user is NGO or employee
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo, employee = self._get_csr_identity()
+        search = (search or '').strip()
+        search_domain, search_values = self._get_search_values(search)
         
         Activity = request.env['csr.activity'].sudo()
         
         if ngo:
             # NGO users see their own activities
-            domain = [('ngo_id', '=', ngo.id)]
+            domain = [('ngo_id', '=', ngo.id)] + search_domain
             activity_count = Activity.search_count(domain)
-            offset = (page - 1) * self._items_per_page
-            activities = Activity.search(domain, limit=self._items_per_page, offset=offset, order='id desc')
+            activities = self._prepare_activity_rows(domain, (page - 1) * self._items_per_page)
         elif employee:
-            # Employee users see all active activities from all NGOs
-            domain = [('active', '=', True)]
-            activity_count = Activity.search_count(domain)
-            offset = (page - 1) * self._items_per_page
-            activities = Activity.search(domain, limit=self._items_per_page, offset=offset, order='id desc')
+            # Employee users see all active activities from all NGOs; the
+            # catalogue is the same for everyone, so its rendering is shared
+            return self._render_activity_catalogue(employee, page, search, sortby=sortby, filterby=filterby,
+                                                   ngo_id=ngo_id, value_min=value_min, value_max=value_max)
         else:
             # No NGO or employee found
             values = {
@@ -283,7 +541,7 @@ class ProjectPortal(portal.CustomerPortal):
         
         pager = request.website.pager(
             url="/my/activities",
-            url_args={},
+            url_args={'search': search} if search else {},
             total=activity_count,
             page=page,
             step=self._items_per_page
@@ -297,14 +555,214 @@ class ProjectPortal(portal.CustomerPortal):
             'ngo': ngo,
             'employee': employee,
             'activity_count': activity_count,
+            'show_ngo': False,
+            'show_purchases': True,
+            **search_values,
         }
         
         return request.render("csr_sustainability.portal_my_activities", values)
 
+    @http.route(['/my/activities/dashboard'], type='http', auth="user", website=True, readonly=replica_readonly)
+    @profiled
+    def portal_ngo_impact_dashboard(self, days=30, **kw):
+        """Display the impact of the NGO's activities and projects, read from
+        the summary tables refreshed by the ``_cron_refresh_impact`` cron"""
+        ngo = self._get_csr_identity()[0]
+        if not ngo:
+            return request.redirect('/my/home')
+        days = int(days) if str(days) in IMPACT_PERIODS else 30
+
+        domain = [('ngo_id', '=', ngo.id)]
+        Daily = request.env['csr.ngo.impact.daily'].sudo()
+        per_activity = Daily._read_group(
+            domain, ['activity_id'], ['purchase_count:sum', 'o2_received:sum'], order='purchase_count:sum desc',
+        )
+        since = fields.Date.context_today(Daily) - timedelta(days=days - 1)
+        per_day = Daily._read_group(
+            domain + [('day', '>=', since)], ['day:day'], ['purchase_count:sum', 'o2_received:sum'], order='day:day desc',
+        )
+        values = {
+            'page_name': 'activity_dashboard',
+            'default_url': '/my/activities/dashboard',
+            'ngo': ngo,
+            'days': days,
+            'periods': IMPACT_PERIODS,
+            'per_activity': per_activity,
+            'per_day': per_day,
+            'purchase_total': sum(count for _activity, count, _o2 in per_activity),
+            'o2_total': sum(o2 for _activity, _count, o2 in per_activity),
+            'reach_count': request.env['csr.ngo.impact.reach'].sudo().search_count(domain),
+            'projects': request.env['csr.ngo.impact.project'].sudo().search(domain),
+        }
+        return request.render("csr_sustainability.portal_ngo_impact_dashboard", values)
+
+    @http.route(['/my/export/<any(purchases,completions):kind>'], type='http', auth="user", methods=['GET'])
+    @profiled
+    def portal_history_export(self, kind, date_from=None, date_to=None, ngo_id=None, **kw):
+        """Stream the purchase or completion history as CSV: NGOs get their
+        own, HR officers get every NGO's or the one of ``ngo_id``"""
+        ngo = self._get_csr_identity()[0]
+        if ngo:
+            ngo_ids = ngo.ids
+        elif request.env.user.has_group('hr.group_hr_user'):
+            ngo_ids = [int(ngo_id)] if ngo_id and ngo_id.isdigit() else None
+        else:
+            return request.redirect('/my/home')
+        try:
+            date_from = fields.Date.to_date(date_from or None)
+            date_to = fields.Date.to_date(date_to or None)
+        except ValueError:
+            raise BadRequest(_('Dates must be given as YYYY-MM-DD.'))
+
+        Export = request.env['csr.history.export'].sudo()
+        query = Export._get_export_query(kind, ngo_ids, date_from, date_to)
+        return request.make_response(
+            _stream_csv(request.env.registry, query, Export._get_export_header(kind)),
+            headers=[
+                ('Content-Type', 'text/csv; charset=utf-8'),
+                ('Content-Disposition', content_disposition(f'{kind}.csv')),
+                ('Cache-Control', 'no-store'),
+            ],
+        )
+
+    def _prepare_activity_rows(self, domain, offset, order='id desc'):
+        """Return a page of the activities matching ``domain`` as the rows
+        of ``portal_my_activities_table``, read with one query for the
+        activities and one for their NGO names however many rows there are"""
+        activities = request.env['csr.activity'].sudo().search_fetch(
+            domain, ['name', 'ngo_id', 'xp', 'value', 'active', 'purchase_count'],
+            limit=self._items_per_page, offset=offset, order=order,
+        )
+        ngos = activities.ngo_id
+        ngos.fetch(['name'])
+        return [{
+            'id': activity.id,
+            'name': activity.name,
+            'url': f'/my/activities/{activity.id}',
+            'ngo_name': activity.ngo_id.name,
+            'xp': activity.xp,
+            'value': activity.value,
+            'active': activity.active,
+            'purchase_count': activity.purchase_count,
+        } for activity in activities]
+
+    def _get_catalogue_options(self, employee, sortby=None, filterby=None, ngo_id=None, value_min=None, value_max=None):
+        """Return the domain and order of the sorting and filters chosen in
+        the activity catalogue, the query arguments keeping them across
+        pages and the values of the template. The NGOs of the filter are
+        added by the caller, once it knows the page has to be rendered.
+
+        Affordability is a single comparison of the activity XP with the
+        employee balance, served by the ``(active, xp)`` index.
+        """
+        searchbar_sortings = {
+            'newest': {'label': _('Newest'), 'order': 'id desc'},
+            'xp': {'label': _('Lowest XP'), 'order': 'xp, id desc'},
+            'value': {'label': _('Highest O2 Value'), 'order': 'value desc, id desc'},
+            'o2_per_xp': {'label': _('Best O2 per XP'), 'order': 'o2_per_xp desc, id desc'},
+        }
+        searchbar_filters = {
+            'all': {'label': _('All'), 'domain': []},
+            'affordable': {'label': _('Affordable with my XP'), 'domain': [('xp', '<=', employee.sustainability_points or 0)]},
+        }
+        sortby = sortby if sortby in searchbar_sortings else 'newest'
+        filterby = filterby if filterby in searchbar_filters else 'all'
+        ngo_id = int(ngo_id) if ngo_id and str(ngo_id).isdigit() else None
+        value_min, value_max = _parse_amount(value_min), _parse_amount(value_max)
+
+        domain = list(searchbar_filters[filterby]['domain'])
+        if ngo_id:
+            domain.append(('ngo_id', '=', ngo_id))
+        if value_min is not None:
+            domain.append(('value', '>=', value_min))
+        if value_max is not None:
+            domain.append(('value', '<=', value_max))
+        url_args = {
+            'sortby': sortby if sortby != 'newest' else None,
+            'filterby': filterby if filterby != 'all' else None,
+            'ngo_id': ngo_id,
+            'value_min': value_min,
+            'value_max': value_max,
+        }
+        return domain, searchbar_sortings[sortby]['order'], {k: v for k, v in url_args.items() if v is not None}, {
+            'searchbar_sortings': searchbar_sortings,
+            'sortby': sortby,
+            'searchbar_filters': searchbar_filters,
+            'filterby': filterby,
+            'catalogue_ngo_id': ngo_id,
+            'value_min': value_min,
+            'value_max': value_max,
+            'catalogue_filtered': bool(domain),
+        }
+
+    def _render_activity_catalogue(self, employee, page, search='', **options):
+        """Render the activity catalogue of employees.
+
+        The standard pages (no search, no filter) are rendered once per page,
+        order and catalogue version and shared by all employees in
+        ``CATALOGUE_CACHE``, only the page around them (layout, XP balance)
+        is rendered per user; searches and filters are rendered on demand
+        so that they do not evict them. The response carries an ETag, from
+        the catalogue version and the balance, and is answered with a 304
+        when the browser already has it. The NGOs of the filter are read
+        after that check and cached with the catalogue version too, which
+        the NGO changes bump.
+        """
+        version = CATALOGUE_CACHE.version(request.env)
+        search_domain, search_values = self._get_search_values(search)
+        options_domain, order, url_args, options_values = self._get_catalogue_options(employee, **options)
+        key = (request.env.lang, page, search, repr(options_domain), order)
+        etag = hashlib.sha1(repr((version, key, request.session.sid, employee.sustainability_points)).encode()).hexdigest()
+        if not is_resource_modified(request.httprequest.environ, etag=etag):
+            response = request.make_response('', status=304)
+            response.set_etag(etag)
+            return response
+
+        domain = [('active', '=', True)] + search_domain + options_domain
+
+        def render():
+            activities = self._prepare_activity_rows(domain, (page - 1) * self._items_per_page, order)
+            return request.env['csr.activity'].sudo().search_count(domain), request.env['ir.qweb']._render(
+                'csr_sustainability.portal_my_activities_table', {'activities': activities, 'show_ngo': True, 'show_purchases': False},
+            )
+
+        if search or options_domain:
+            activity_count, activities_table = render()
+        else:
+            activity_count, activities_table = CATALOGUE_CACHE.get(request.env, key, render, version)
+        catalogue_ngos = CATALOGUE_CACHE.get(
+            request.env, ('ngos',), lambda: request.env['csr.ngo'].sudo().search_read([], ['name'], order='name'), version,
+        )
+
+        pager = request.website.pager(
+            url="/my/activities",
+            url_args=dict(url_args, search=search) if search else url_args,
+            total=activity_count,
+            page=page,
+            step=self._items_per_page
+        )
+        values = {
+            'activities_table': activities_table,
+            'page_name': 'activity',
+            'pager': pager,
+            'default_url': '/my/activities',
+            'ngo': False,
+            'employee': employee,
+            'activity_count': activity_count,
+            **search_values,
+            **options_values,
+            'catalogue_ngos': catalogue_ngos,
+        }
+        response = request.render("csr_sustainability.portal_my_activities", values)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
     @http.route(['/my/activities/new'], type='http', auth="user", website=True, methods=['GET', 'POST'])
+    @profiled
     def portal_my_activities_new(self, **kw):
         """Create a new activity"""
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo = self._get_csr_identity()[0]
         if not ngo:
             return request.redirect('/my/home')
 
@@ -320,6 +778,7 @@ class ProjectPortal(portal.CustomerPortal):
             # Remove empty values
             vals = {k: v for k, v in vals.items() if v}
             activity = request.env['csr.activity'].sudo().create(vals)
+            remember_write()
             return request.redirect(f'/my/activities/{activity.id}')
 
         values = {
@@ -330,9 +789,10 @@ class ProjectPortal(portal.CustomerPortal):
         return request.render("csr_sustainability.portal_activity_new", values)
 
     @http.route(['/my/activities/<int:activity_id>/edit'], type='http', auth="user", website=True, methods=['GET', 'POST'])
+    @profiled
     def portal_my_activities_edit(self, activity_id=None, **kw):
         """Edit an activity"""
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo = self._get_csr_identity()[0]
         if not ngo:
             return request.redirect('/my/home')
         
@@ -358,6 +818,7 @@ class ProjectPortal(portal.CustomerPortal):
             # Remove empty values but keep description
             vals = {k: v for k, v in vals.items() if v is not False or k == 'description'}
             activity.write(vals)
+            remember_write()
             return request.redirect(f'/my/activities/{activity.id}')
         
         values = {
@@ -367,11 +828,11 @@ class ProjectPortal(portal.CustomerPortal):
         }
         return request.render("csr_sustainability.portal_activity_edit", values)
 
-    @http.route(['/my/activities/<int:activity_id>'], type='http', auth="user", website=True)
+    @http.route(['/my/activities/<int:activity_id>'], type='http', auth="user", website=True, readonly=replica_readonly)
+    @profiled
     def portal_activity_page(self, activity_id=None, access_token=None, **kw):
         """Display a single activity"""
-        ngo = request.env['csr.ngo'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
-        employee = request.env['hr.employee'].sudo().search([('user_id', '=', request.env.user.id)], limit=1)
+        ngo, employee = self._get_csr_identity()
         
         try:
             activity_sudo = request.env['csr.activity'].sudo().browse(activity_id)
@@ -397,3 +858,76 @@ class ProjectPortal(portal.CustomerPortal):
         
         return request.render("csr_sustainability.portal_activity_template", values)
 
+    @http.route(['/my/activities/purchase_batch'], type='jsonrpc', auth="user", methods=['POST'])
+    @profiled
+    def portal_activities_purchase_batch(self, items=None, **kw):
+        """Purchase activities for many employees at once (HR campaigns).
+
+        ``items`` is a list of ``{'employee_id': ..., 'activity_id': ...}``;
+        the result gives the outcome of each item, in the same order.
+        """
+        if not request.env.user.has_group('hr.group_hr_user'):
+            raise AccessError(_('Only HR officers can purchase activities for other employees.'))
+        # malformed items get their error result, the others are purchased
+        results, pairs = [], []
+        for item in items or []:
+            try:
+                pairs.append((int(item['employee_id']), int(item['activity_id'])))
+            except (KeyError, TypeError, ValueError):
+                results.append({
+                    'employee_id': item.get('employee_id') if isinstance(item, dict) else None,
+                    'activity_id': item.get('activity_id') if isinstance(item, dict) else None,
+                    'success': False,
+                    'error': _('Invalid item: employee_id and activity_id must be ids'),
+                })
+            else:
+                results.append(None)
+        purchased = iter(request.env['csr.activity.purchase'].sudo()._purchase_batch(pairs))
+        results = [result or next(purchased) for result in results]
+        remember_write()
+        return results
+
+    @http.route(['/my/leaderboard/json'], type='http', auth="user", methods=['GET'], readonly=replica_readonly)
+    @profiled
+    def portal_leaderboard_json(self, limit=20, after_o2=None, after_id=None, **kw):
+        """Return ranked employees as JSON, best first.
+
+        Pages are chained with the ``next_cursor`` of the previous response
+        (``after_o2`` and ``after_id``). Pages within the top of the
+        leaderboard are served from memory.
+        """
+        limit = _parse_limit(limit)
+        try:
+            after = (float(after_o2), int(after_id)) if after_o2 is not None and after_id is not None else None
+        except ValueError:
+            raise BadRequest(_('The cursor must be given as a number (after_o2) and an id (after_id).'))
+        Employee = request.env['hr.employee'].sudo()
+        
+        top = Employee._get_leaderboard_top()
+        if after is None:
+            start = 0
+        else:
+            start = next((index + 1 for index, entry in enumerate(top) if (entry['money_O2'], entry['id']) == after), None)
+        if start is not None and (start + limit <= len(top) or len(top) < LEADERBOARD_TOP_SIZE):
+            entries = list(top[start:start + limit])
+        else:
+            entries = Employee._read_leaderboard(limit, after)
+        
+        next_cursor = None
+        if len(entries) == limit:
+            next_cursor = {'after_o2': entries[-1]['money_O2'], 'after_id': entries[-1]['id']}
+        return request.make_json_response({'employees': entries, 'next_cursor': next_cursor})
+
+    @http.route(['/my/leaderboard/<any(week,month,quarter):period>/json'], type='http', auth="user", methods=['GET'],
+                readonly=replica_readonly)
+    @profiled
+    def portal_leaderboard_period_json(self, period, limit=10, **kw):
+        """Return the best employees and the department ranking of the
+        current week, month or quarter as JSON, from the period totals"""
+        limit = _parse_limit(limit)
+        Totals = request.env['csr.leaderboard.period'].sudo()
+        return request.make_json_response({
+            'period_start': str(Totals._get_current_starts()[period]),
+            'employees': Totals._get_top(period, limit),
+            'departments': Totals._get_department_ranking(period),
+        })
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+# Samples of the read-only requests, which may run on a replica, per
+# database: they are stored by the next request of the worker that has a
+# primary cursor. The oldest ones are dropped (they are still logged) if
+# none comes.
+_pending_samples = defaultdict(lambda: deque(maxlen=1000))
+_pending_lock = threading.Lock()
+
+
+def _sql_counters():
+    """Return the number of queries and the SQL time (in seconds) of the
+    current request so far, as tracked by the database layer."""
+    thread = threading.current_thread()
+    if hasattr(thread, 'query_count'):
+        return thread.query_count, thread.query_time
+    return request.env.cr.sql_log_count, 0.0
+
+
+def profiled(endpoint):
+    """Measure a portal route when ``csr_sustainability.portal_profiling`` is set.
+
+    Each request records its SQL query count and time, the Python time
+    spent in the controller outside SQL (ORM and computes) and the template
+    render time. Samples are logged, stored for the per-route percentiles
+    of ``csr.route.stats`` and, if ``csr_sustainability.portal_server_timing``
+    is set, sent back as a ``Server-Timing`` header.
+
+    Read-only requests do not open a cursor on the primary to store their
+    sample: it is buffered in the worker and stored by its next writing
+    request.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(self, *args, **kwargs):
+        ICP = request.env['ir.config_parameter'].sudo()
+        if not ICP.get_param('csr_sustainability.portal_profiling'):
+            return endpoint(self, *args, **kwargs)
+
+        start_count, start_sql_time = _sql_counters()
+        start = time.perf_counter()
+        response = endpoint(self, *args, **kwargs)
+        handler_time = time.perf_counter() - start
+        handler_count, handler_sql_time = _sql_counters()
+
+        # QWeb responses are lazy: render them now to time the rendering
+        render_time = 0.0
+        if getattr(response, 'is_qweb', False):
+            render_start = time.perf_counter()
+            response.flatten()
+            render_time = time.perf_counter() - render_start
+        end_count, end_sql_time = _sql_counters()
+
+        sample = {
+            'route': endpoint.__name__,
+            'date': time.time(),
+            'sql_count': end_count - start_count,
+            'sql_time': (end_sql_time - start_sql_time) * 1000,
+            'python_time': max(handler_time - (handler_sql_time - start_sql_time), 0.0) * 1000,
+            'render_time': render_time * 1000,
+            'total_time': (handler_time + render_time) * 1000,
+        }
+        _logger.info("csr.profile %s", json.dumps(sample))
+        with _pending_lock:
+            pending = _pending_samples[request.env.cr.dbname]
+            pending.append(sample)
+            if request.env.cr.readonly:
+                samples = []
+            else:
+                samples = list(pending)
+                pending.clear()
+        if samples:
+            request.env['csr.route.sample'].sudo()._record(samples)
+
+        if ICP.get_param('csr_sustainability.portal_server_timing') and hasattr(response, 'headers'):
+            response.headers['Server-Timing'] = ', '.join([
+                f'sql;dur={sample["sql_time"]:.1f};desc="{sample["sql_count"]} queries"',
+                f'python;dur={sample["python_time"]:.1f}',
+                f'render;dur={sample["render_time"]:.1f}',
+            ])
+        return response
+    return wrapper
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo.http import request
+
+# Seconds during which the reads of a user who just wrote are served by the
+# primary database, to hide the replication lag of the replica from them
+READ_YOUR_WRITES_DELAY = 10
+
+_SESSION_KEY = 'csr_last_write'
+
+
+def replica_readonly(controller, rule, args):
+    """``readonly`` of the read-only portal routes.
+
+    Read-only routes run on a read-only cursor, which Odoo opens on the
+    replica when ``db_replica_host`` is configured (and on the primary
+    otherwise), except shortly after the user's own writes: those requests
+    go to the primary so that the user reads what they just wrote.
+    """
+    return time.time() - request.session.get(_SESSION_KEY, 0) > READ_YOUR_WRITES_DELAY
+
+
+def remember_write():
+    """Record that the current user just wrote, see ``replica_readonly``"""
+    request.session[_SESSION_KEY] = time.time()
@@ -3,3 +3,13 @@ from . import project
 from . import task
 from . import ngo
 from . import activity
+from . import ledger
+from . import award_queue
+from . import purchase_history
+from . import leaderboard
+from . import ngo_impact
+from . import ngo_import
+from . import history_export
+from . import res_config_settings
+from . import res_users
+from . import route_profile
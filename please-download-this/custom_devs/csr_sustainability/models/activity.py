@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models
+from odoo import _, api, fields, models
+from odoo.tools import SQL
+
+from .cache import SignaledCache
+
+# Rendered pages of the employee activity catalogue and their activity
+# count, shared by all users, see ProjectPortal._render_activity_catalogue.
+# It is invalidated whenever anything the catalogue shows changes: an
+# activity or the name of an NGO. Purchases do not show there.
+CATALOGUE_CACHE = SignaledCache('catalogue', 256)
 
 
 class CSRActivity(models.Model):
@@ -8,19 +17,56 @@ class CSRActivity(models.Model):
     _inherit = ['portal.mixin']
     _order = 'name'
     
-    name = fields.Char(string='Activity Name', required=True)
-    description = fields.Text(string='Description')
+    name = fields.Char(string='Activity Name', required=True, index='trigram')
+    description = fields.Text(string='Description', index='trigram')
     ngo_id = fields.Many2one('csr.ngo', string='NGO', required=True, ondelete='cascade', index=True)
     xp = fields.Float(string='XP (Price)', required=True, help='Amount of XP employees need to pay to purchase this activity')
     value = fields.Float(string='O2 Value', required=True, help='Amount of O2 employees receive when purchasing this activity')
     active = fields.Boolean(string='Active', default=True)
     purchase_ids = fields.One2many('csr.activity.purchase', 'activity_id', string='Purchases')
-    purchase_count = fields.Integer(string='Purchase Count', compute='_compute_purchase_count')
+    purchase_count = fields.Integer(string='Purchase Count', compute='_compute_purchase_count', store=True)
+    o2_per_xp = fields.Float(string='O2 per XP', compute='_compute_o2_per_xp', store=True,
+                             help='O2 received per XP spent, to sort the catalogue by best value')
+
+    # The catalogue filters the active activities on the XP employees can afford
+    _active_xp_idx = models.Index('(active, xp)')
+
+    def init(self):
+        super().init()
+        CATALOGUE_CACHE.init(self.env.cr)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        activities = super().create(vals_list)
+        CATALOGUE_CACHE.invalidate(self.env)
+        return activities
+
+    def write(self, vals):
+        res = super().write(vals)
+        CATALOGUE_CACHE.invalidate(self.env)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        CATALOGUE_CACHE.invalidate(self.env)
+        return res
+
+    @api.depends('xp', 'value')
+    def _compute_o2_per_xp(self):
+        for activity in self:
+            activity.o2_per_xp = activity.value / activity.xp if activity.xp else 0.0
     
     @api.depends('purchase_ids')
     def _compute_purchase_count(self):
+        purchase_counts = dict(self.env['csr.activity.purchase']._read_group(
+            [('activity_id', 'in', self.ids)], ['activity_id'], ['__count'],
+        ))
+        # Archived purchases still count towards the historical totals
+        archived_counts = dict(self.env['csr.activity.purchase.archive']._read_group(
+            [('activity_id', 'in', self.ids)], ['activity_id'], ['__count'],
+        ))
         for activity in self:
-            activity.purchase_count = len(activity.purchase_ids)
+            activity.purchase_count = purchase_counts.get(activity._origin, 0) + archived_counts.get(activity._origin, 0)
     
     def _compute_access_url(self):
         super()._compute_access_url()
@@ -40,3 +86,93 @@ class CSRActivityPurchase(models.Model):
     o2_received = fields.Float(string='O2 Received', required=True)
     ngo_id = fields.Many2one('csr.ngo', string='NGO', related='activity_id.ngo_id', store=True, readonly=True)
 
+    _employee_date_idx = models.Index('(employee_id, purchase_date)')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        purchases = super().create(vals_list)
+        # Keep the weekly, monthly and quarterly leaderboards up to date
+        if purchases:
+            purchases.flush_recordset(['employee_id', 'purchase_date', 'o2_received'])
+            self.env['csr.leaderboard.period'].sudo()._add_purchases(purchases._select_for_leaderboard())
+            # Left to the purchase summaries, once committed
+            self.env['csr.activity.purchase.queue'].sudo()._enqueue(purchases)
+        # Pay the XP and credit the O2 through the ledger
+        self.env['csr.points.ledger'].sudo().create([{
+            'employee_id': purchase.employee_id.id,
+            'reason': 'purchase',
+            'xp_delta': -round(purchase.xp_paid),
+            'o2_delta': purchase.o2_received,
+            'purchase_id': purchase.id,
+        } for purchase in purchases])
+        return purchases
+
+    def unlink(self):
+        self.env['csr.activity.purchase.monthly'].sudo()._subtract_purchases(self)
+        self.env['csr.ngo.impact.daily'].sudo()._subtract_purchases(self)
+        if self:
+            self.flush_recordset(['employee_id', 'purchase_date', 'o2_received'])
+            self.env['csr.leaderboard.period'].sudo()._add_purchases(self._select_for_leaderboard(), sign=-1)
+        return super().unlink()
+
+    def _select_for_leaderboard(self):
+        """Return the query selecting these purchases for ``csr.leaderboard.period._add_purchases``"""
+        return SQL(
+            "SELECT employee_id, purchase_date, o2_received FROM csr_activity_purchase WHERE id IN %s",
+            tuple(self.ids),
+        )
+
+    @api.model
+    def _purchase_batch(self, items):
+        """Purchase activities for many employees at once.
+
+        The balances of all the employees are checked (and locked) with one
+        query, the valid purchases are inserted with one ``create`` and their
+        XP/O2 are applied by one grouped ledger update.
+
+        :param items: list of ``(employee_id, activity_id)`` pairs
+        :return: one dict per item, in the same order, with the keys
+            ``employee_id``, ``activity_id``, ``success`` and either
+            ``purchase_id`` or ``error``
+        """
+        results = [{'employee_id': employee_id, 'activity_id': activity_id, 'success': False} for employee_id, activity_id in items]
+        if not items:
+            return results
+        activities = {
+            activity.id: activity
+            for activity in self.env['csr.activity'].search_fetch(
+                [('id', 'in', list({activity_id for _employee_id, activity_id in items})), ('active', '=', True)],
+                ['xp', 'value'],
+            )
+        }
+        self.env['hr.employee'].flush_model(['sustainability_points', 'active'])
+        self.env.cr.execute(SQL("""
+            SELECT id, COALESCE(sustainability_points, 0)
+              FROM hr_employee
+             WHERE id IN %s AND active
+          ORDER BY id
+               FOR NO KEY UPDATE
+        """, tuple({employee_id for employee_id, _activity_id in items})))
+        balances = dict(self.env.cr.fetchall())
+
+        vals_list, purchased = [], []
+        for result in results:
+            activity = activities.get(result['activity_id'])
+            if result['employee_id'] not in balances:
+                result['error'] = _('Unknown employee')
+            elif not activity:
+                result['error'] = _('Unknown or inactive activity')
+            elif balances[result['employee_id']] < round(activity.xp):
+                result['error'] = _('Not enough XP')
+            else:
+                balances[result['employee_id']] -= round(activity.xp)
+                vals_list.append({
+                    'activity_id': activity.id,
+                    'employee_id': result['employee_id'],
+                    'xp_paid': activity.xp,
+                    'o2_received': activity.value,
+                })
+                purchased.append(result)
+        for result, purchase in zip(purchased, self.create(vals_list)):
+            result.update(success=True, purchase_id=purchase.id)
+        return results
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import Command, api, fields, models
+from odoo.tools import SQL
+
+
+class CSRAwardQueue(models.Model):
+    _name = 'csr.award.queue'
+    _description = 'Pending CSR Project Completion Award'
+    _order = 'id'
+    _log_access = False
+
+    project_id = fields.Many2one('project.project', string='Project', required=True, readonly=True, ondelete='cascade')
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, ondelete='cascade', index=True)
+    xp = fields.Integer(string='XP', readonly=True, help='XP awarded, as set on the project when it was marked as done')
+    date = fields.Datetime(string='Date', required=True, readonly=True, default=fields.Datetime.now)
+
+    _project_employee_uniq = models.Constraint(
+        'UNIQUE(project_id, employee_id)',
+        'A project completion can be queued only once per employee.',
+    )
+
+    @api.model
+    def _is_enabled(self):
+        """Return whether project completions are queued instead of applied
+        within the request that marks them"""
+        return self.env['ir.config_parameter'].sudo().get_param('csr_sustainability.award_mode', 'sync') == 'queued'
+
+    @api.model
+    def _enqueue(self, project, employees):
+        """Queue the completion of ``project`` by ``employees`` and wake up the
+        cron applying them. Nothing but the queue row is written, so concurrent
+        completions do not wait on the employee and project rows."""
+        self.env.cr.execute(SQL("""
+            INSERT INTO csr_award_queue (project_id, employee_id, xp, date)
+            SELECT %(project_id)s, employee_id, %(xp)s, NOW() AT TIME ZONE 'UTC'
+              FROM UNNEST(%(employee_ids)s) AS employee_id
+                ON CONFLICT (project_id, employee_id) DO NOTHING
+        """, project_id=project.id, xp=int(project.xp), employee_ids=employees.ids))
+        self.env.ref('csr_sustainability.ir_cron_award_queue').sudo()._trigger()
+
+    @api.model
+    def _cron_process_queue(self, batch_size=1000):
+        """Apply a batch of queued completions: one write per project for the
+        completions and one ledger update for all the XP, which increments
+        each employee once. The rows are taken with ``SKIP LOCKED`` so that
+        several workers can drain the queue side by side."""
+        self.env.cr.execute(SQL("""
+            DELETE FROM csr_award_queue
+             WHERE id IN (
+                    SELECT id
+                      FROM csr_award_queue
+                  ORDER BY id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+             )
+         RETURNING project_id, employee_id, xp, date
+        """, batch_size))
+        awards = self.env.cr.fetchall()
+        if len(awards) == batch_size:
+            self.env.ref('csr_sustainability.ir_cron_award_queue')._trigger()
+        if not awards:
+            return
+
+        # Skip the completions recorded meanwhile, e.g. while switching modes
+        Project = self.env['project.project'].sudo()
+        Project.flush_model(['completed_by_employee_ids'])
+        self.env.cr.execute(SQL("""
+            SELECT project_id, employee_id
+              FROM project_employee_completion_rel
+             WHERE (project_id, employee_id) IN %s
+        """, tuple((project_id, employee_id) for project_id, employee_id, _xp, _date in awards)))
+        completed = set(self.env.cr.fetchall())
+        employee_ids_by_project = defaultdict(list)
+        ledger_vals = []
+        dates = []
+        for project_id, employee_id, xp, date in awards:
+            if (project_id, employee_id) in completed:
+                continue
+            employee_ids_by_project[project_id].append(employee_id)
+            dates.append((project_id, employee_id, date))
+            if xp > 0:
+                ledger_vals.append({
+                    'employee_id': employee_id,
+                    'reason': 'completion',
+                    'xp_delta': xp,
+                    'project_id': project_id,
+                })
+        for project_id, employee_ids in employee_ids_by_project.items():
+            Project.browse(project_id).write({
+                'completed_by_employee_ids': [Command.link(employee_id) for employee_id in employee_ids]
+            })
+        if dates:
+            # the employees completed the projects when they were queued
+            Project.flush_model(['completed_by_employee_ids'])
+            self.env.cr.execute(SQL("""
+                UPDATE project_employee_completion_rel completion
+                   SET date = award.date
+                  FROM (VALUES %s) AS award (project_id, employee_id, date)
+                 WHERE completion.project_id = award.project_id
+                   AND completion.employee_id = award.employee_id
+            """, SQL(', ').join(SQL("(%s, %s, %s::timestamp)", *award) for award in dates)))
+        self.env['csr.points.ledger'].sudo().create(ledger_vals)
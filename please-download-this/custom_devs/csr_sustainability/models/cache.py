@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from odoo.modules import module
+from odoo.tools import SQL
+from odoo.tools.lru import LRU
+
+
+class SignaledCache:
+    """Process-wide cache of values read from the database, shared by the
+    workers and invalidated on its own, without touching the registry
+    caches (ACLs, rules, parameters, views...).
+
+    Entries are keyed by database and by the version of the cache, a row
+    of ``csr_cache_version`` which ``invalidate`` increments once the
+    transaction has committed: every worker misses on its next lookup. The
+    row is committed like any other, so the new version also reaches the
+    hot standbys serving the read-only routes (a sequence would not: its
+    changes are only WAL-logged every 32 values). It is incremented in a
+    transaction of its own, at READ COMMITTED, so that concurrent writers
+    never get a serialization failure on it; until then, the transaction
+    that invalidated the cache does not read it.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.lru = LRU(size)
+
+    def init(self, cr):
+        """Create the version row of the cache, from the ``init`` of its model"""
+        cr.execute(SQL("""
+            CREATE TABLE IF NOT EXISTS csr_cache_version (
+                name VARCHAR PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """))
+        cr.execute(SQL("INSERT INTO csr_cache_version (name) VALUES (%s) ON CONFLICT DO NOTHING", self.name))
+
+    def version(self, env):
+        """Return the current version of the cache, e.g. for an ETag"""
+        env.cr.execute(SQL("SELECT version FROM csr_cache_version WHERE name = %s", self.name))
+        return env.cr.fetchone()[0]
+
+    def get(self, env, key, compute, version=None):
+        """Return the cached value of ``key``, or cache and return ``compute()``.
+        ``version`` saves a query when the caller already read it."""
+        if self._bypassed(env):
+            return compute()
+        cache_key = (env.cr.dbname, version if version is not None else self.version(env), key)
+        try:
+            return self.lru[cache_key]
+        except KeyError:
+            value = self.lru[cache_key] = compute()
+            return value
+
+    def invalidate(self, env):
+        """Drop all the entries of the cache, in all the workers"""
+        signal_key = f'csr_cache_{self.name}'
+        if env.cr.postcommit.data.get(signal_key):
+            return
+        env.cr.postcommit.data[signal_key] = True
+        registry, name = env.registry, self.name
+
+        @env.cr.postcommit.add
+        def signal():
+            with registry.cursor() as cr:
+                cr.execute(SQL("SET TRANSACTION ISOLATION LEVEL READ COMMITTED"))
+                cr.execute(SQL("UPDATE csr_cache_version SET version = version + 1 WHERE name = %s", name))
+
+    def _bypassed(self, env):
+        # The transaction invalidating the cache reads the database until it
+        # has committed. Tests never commit: the versions they would use are
+        # those of the previous tests, whose data was rolled back.
+        return (
+            env.cr.postcommit.data.get(f'csr_cache_{self.name}')
+            or module.current_test
+            or env.registry.in_test_mode()
+        )
+
+
+def values_changed(records, vals, field_names):
+    """Return whether writing ``vals`` on ``records`` changes the value of
+    any of ``field_names``, to invalidate caches only on actual changes"""
+    return any(
+        records._fields[name].convert_to_write(record[name], record) != vals[name]
+        for name in field_names if name in vals
+        for record in records
+    )
@@ -1,62 +1,276 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+from .cache import SignaledCache, values_changed
+
+# Number of leaderboard entries kept in memory for the screens polling it
+LEADERBOARD_TOP_SIZE = 100
+
+# Top of the leaderboard per language, see HrEmployee._get_leaderboard_top
+LEADERBOARD_CACHE = SignaledCache('leaderboard', 16)
 
 
 class HrEmployee(models.Model):
     _inherit = 'hr.employee'
     
-    sustainability_points = fields.Integer(string='Sustainability Points', help='XP points that can be used to purchase activities')
+    # searched with ilike by the name fallback of res.users._get_csr_identity_ids
+    name = fields.Char(index='trigram')
+    sustainability_points = fields.Integer(string='Sustainability Points', readonly=True, help='XP points that can be used to purchase activities')
     badge = fields.Selection([
         ('bronze', 'Bronze'),
         ('silver', 'Silver'),
         ('gold', 'Gold'),
-    ], string='Badge', compute='_compute_badge')
-    money_O2 = fields.Float(string='Money O2', help='O2 value earned from purchasing activities')
+    ], string='Badge', compute='_compute_badge', store=True, index=True)
+    money_O2 = fields.Float(string='Money O2', default=0.0, index=True, readonly=True, help='O2 value earned from purchasing activities')
     activity_purchase_ids = fields.One2many('csr.activity.purchase', 'employee_id', string='Activity Purchases')
-    activity_purchase_count = fields.Integer(string='Purchase Count', compute='_compute_activity_purchase_count')
+    points_ledger_ids = fields.One2many('csr.points.ledger', 'employee_id', string='XP/O2 Ledger')
+    activity_purchase_count = fields.Integer(string='Purchase Count', compute='_compute_activity_purchase_count', store=True)
     
     @api.depends('activity_purchase_ids')
     def _compute_activity_purchase_count(self):
+        purchase_counts = dict(self.env['csr.activity.purchase']._read_group(
+            [('employee_id', 'in', self.ids)], ['employee_id'], ['__count'],
+        ))
+        # Archived purchases still count towards the historical totals
+        archived_counts = dict(self.env['csr.activity.purchase.archive']._read_group(
+            [('employee_id', 'in', self.ids)], ['employee_id'], ['__count'],
+        ))
         for employee in self:
-            employee.activity_purchase_count = len(employee.activity_purchase_ids)
+            employee.activity_purchase_count = purchase_counts.get(employee._origin, 0) + archived_counts.get(employee._origin, 0)
 
     @api.depends('money_O2')
     def _compute_badge(self):
+        silver_threshold, gold_threshold = self._get_badge_thresholds()
         for employee in self:
-            if employee.money_O2 >= 100:
+            if employee.money_O2 >= gold_threshold:
                 employee.badge = 'gold'
-            elif employee.money_O2 >= 50:
+            elif employee.money_O2 >= silver_threshold:
                 employee.badge = 'silver'
             else:
                 employee.badge = 'bronze'
+
+    @api.model
+    def _get_badge_thresholds(self):
+        """Return the O2 needed for the silver and gold badges (see settings)"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        return (
+            float(ICP.get_param('csr_sustainability.badge_silver_threshold', 50)),
+            float(ICP.get_param('csr_sustainability.badge_gold_threshold', 100)),
+        )
+
+    @api.model
+    def _reclassify_badges(self):
+        """Recompute the badge of all employees with one set-based UPDATE,
+        e.g. after a change of thresholds. Only changed rows are written."""
+        silver_threshold, gold_threshold = self._get_badge_thresholds()
+        badge = SQL("""
+            CASE WHEN COALESCE("money_O2", 0) >= %s THEN 'gold'
+                 WHEN COALESCE("money_O2", 0) >= %s THEN 'silver'
+                 ELSE 'bronze'
+            END
+        """, gold_threshold, silver_threshold)
+        self.flush_model(['money_O2', 'badge'])
+        self.env.cr.execute(SQL("UPDATE hr_employee SET badge = %s WHERE badge IS DISTINCT FROM %s", badge, badge))
+        if self.env.cr.rowcount:
+            self.invalidate_model(['badge'])
     
-    @api.depends('money_O2')
-    def _compute_leaderboard_rank(self):
-        """Compute the rank of employees based on O2 currency"""
-        # Get all employees with their O2 values
-        all_employees = self.env['hr.employee'].search([])
-        
-        # Create a list of (id, money_O2) tuples and sort by O2 descending
-        employee_o2_list = [(emp.id, emp.money_O2) for emp in all_employees]
-        employee_o2_list.sort(key=lambda x: x[1], reverse=True)
-        
-        # Create rank dictionary
-        rank_dict = {}
-        current_rank = 1
-        prev_o2 = None
-        
-        for emp_id, o2_value in employee_o2_list:
-            # If O2 is different from previous, update rank
-            if prev_o2 is not None and o2_value < prev_o2:
-                current_rank = len([(eid, o2) for eid, o2 in employee_o2_list if o2 > o2_value]) + 1
-            rank_dict[emp_id] = current_rank
-            prev_o2 = o2_value
-        
-        # Assign ranks to current records
-        for employee in self:
-            employee.leaderboard_rank = rank_dict.get(employee.id, 0)
-    
-    leaderboard_rank = fields.Integer(string='Rank', compute='_compute_leaderboard_rank', store=False, help='Rank in the leaderboard based on O2 currency')
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        employees._update_leaderboard_rank(dict.fromkeys(employees.ids))
+        # res.users._get_csr_identity_ids caches the employee of each user
+        self.env.registry.clear_cache()
+        # and _get_leaderboard_top the best employees
+        LEADERBOARD_CACHE.invalidate(self.env)
+        return employees
+
+    def write(self, vals):
+        identity_changed = values_changed(self, vals, ('user_id', 'name', 'active'))
+        top_changed = values_changed(self, vals, ('name', 'active', 'money_O2', 'department_id'))
+        if 'money_O2' in vals or 'active' in vals:
+            previous_o2 = {employee.id: employee.money_O2 if employee.active else None for employee in self}
+        res = super().write(vals)
+        if identity_changed:
+            self.env.registry.clear_cache()
+        if 'money_O2' in vals or 'active' in vals:
+            self._update_leaderboard_rank(previous_o2)
+        if top_changed:
+            LEADERBOARD_CACHE.invalidate(self.env)
+        return res
+
+    def unlink(self):
+        # Deleting employees removes their participations: recount the projects
+        self.env['project.project'].flush_model(['employee_ids', 'completed_by_employee_ids'])
+        self.env.cr.execute(SQL("""
+            SELECT project_project_id FROM hr_employee_project_project_rel WHERE hr_employee_id IN %(ids)s
+             UNION
+            SELECT project_id FROM project_employee_completion_rel WHERE employee_id IN %(ids)s
+        """, ids=tuple(self.ids) or (None,)))
+        projects = self.env['project.project'].browse([row[0] for row in self.env.cr.fetchall()])
+        previous_o2 = {employee.id: employee.money_O2 if employee.active else None for employee in self}
+        res = super().unlink()
+        if projects:
+            projects.sudo()._recount_participation()
+        self._update_leaderboard_rank(previous_o2)
+        self.env.registry.clear_cache()
+        LEADERBOARD_CACHE.invalidate(self.env)
+        return res
+
+    def init(self):
+        super().init()
+        # The leaderboard is paginated on (money_O2, id), which must not be NULL
+        self.env.cr.execute(SQL('UPDATE hr_employee SET "money_O2" = 0 WHERE "money_O2" IS NULL'))
+        LEADERBOARD_CACHE.init(self.env.cr)
+        create_index(self.env.cr, 'hr_employee_leaderboard_idx', 'hr_employee',
+                     ['"money_O2" DESC', 'id DESC'], where='active')
+        self._refresh_leaderboard_rank()
+
+    def _update_leaderboard_rank(self, previous_o2):
+        """Update the leaderboard ranks after the O2 or the archiving of
+        these employees changed, in a single ``UPDATE``.
+
+        The employees moving on the leaderboard only shift the ranks of the
+        employees whose O2 lies between their old and new values: those are
+        ranked again from a ``RANK()`` over that range, offset by the number
+        of active employees above it. An employee entering or leaving the
+        leaderboard shifts everyone below it. Archived employees get 0.
+
+        :param previous_o2: ``{employee_id: money_O2}`` before the change,
+            ``None`` for the employees that were not ranked (new, archived)
+        """
+        if not self:
+            return
+        self.flush_model(['money_O2', 'active', 'leaderboard_rank'])
+        self.env.cr.execute(SQL(
+            'SELECT id, "money_O2" FROM hr_employee WHERE id IN %s AND active',
+            tuple(self.ids),
+        ))
+        current_o2 = dict(self.env.cr.fetchall())
+        bounds = [*previous_o2.values(), *map(current_o2.get, self.ids)]
+        if ranked_o2 := [o2 for o2 in bounds if o2 is not None]:
+            low = None if None in bounds else min(ranked_o2)
+            in_range = SQL('"money_O2" <= %s', max(ranked_o2))
+            if low is not None:
+                in_range = SQL('%s AND "money_O2" >= %s', in_range, low)
+            ranks = SQL("""
+                SELECT id,
+                       (SELECT COUNT(*) FROM hr_employee above WHERE above.active AND above."money_O2" > %s)
+                       + RANK() OVER (ORDER BY "money_O2" DESC) AS rank
+                  FROM hr_employee
+                 WHERE active AND %s
+             UNION ALL
+            """, max(ranked_o2), in_range)
+        else:
+            ranks = SQL()
+        self.env.cr.execute(SQL("""
+            UPDATE hr_employee employee
+               SET leaderboard_rank = ranked.rank
+              FROM (
+                    %s
+                    SELECT id, 0 FROM hr_employee WHERE id IN %s AND NOT active
+                   ) ranked
+             WHERE employee.id = ranked.id
+               AND employee.leaderboard_rank IS DISTINCT FROM ranked.rank
+        """, ranks, tuple(self.ids)))
+        if self.env.cr.rowcount:
+            self.invalidate_model(['leaderboard_rank'])
+
+    @api.model
+    def _cron_refresh_leaderboard_rank(self):
+        """Check the ranks of all employees, which every O2 change keeps up
+        to date, e.g. after balances were fixed directly in the database"""
+        if self._refresh_leaderboard_rank():
+            LEADERBOARD_CACHE.invalidate(self.env)
+
+    @api.model
+    def _refresh_leaderboard_rank(self):
+        """Recompute the stored leaderboard rank of all employees.
+
+        The ranks come from a single ``RANK() OVER (ORDER BY money_O2 DESC)``
+        pass in SQL and only the rows whose rank actually changed are updated.
+        Archived employees are not ranked and get 0. This scans and may lock
+        many employees: it runs on installation and from its cron, while the
+        transactions that change O2 use ``_update_leaderboard_rank``.
+
+        :return: whether any rank changed
+        """
+        self.flush_model(['money_O2', 'active', 'leaderboard_rank'])
+        self.env.cr.execute(SQL("""
+            UPDATE hr_employee employee
+               SET leaderboard_rank = ranked.rank
+              FROM (
+                    SELECT id,
+                           CASE WHEN active
+                                THEN RANK() OVER (PARTITION BY active ORDER BY COALESCE("money_O2", 0) DESC)
+                                ELSE 0
+                           END AS rank
+                      FROM hr_employee
+                   ) ranked
+             WHERE employee.id = ranked.id
+               AND employee.leaderboard_rank IS DISTINCT FROM ranked.rank
+        """))
+        if not self.env.cr.rowcount:
+            return False
+        self.invalidate_model(['leaderboard_rank'])
+        return True
+
+    @api.model
+    def _read_leaderboard(self, limit, after=None):
+        """Return up to ``limit`` ranked employees, best first.
+
+        The leaderboard is paginated by keyset: ``after`` is the
+        ``(money_O2, id)`` of the last employee of the previous page.
+        """
+        self.flush_model(['money_O2', 'active', 'leaderboard_rank'])
+        self.env.cr.execute(SQL("""
+            SELECT id
+              FROM hr_employee
+             WHERE active %s
+          ORDER BY "money_O2" DESC, id DESC
+             LIMIT %s
+        """, SQL('AND ("money_O2", id) < (%s, %s)', *after) if after else SQL(), limit))
+        employees = self.sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        return [{
+            'id': employee.id,
+            'name': employee.name,
+            'department': employee.department_id.name or '',
+            'rank': employee.leaderboard_rank,
+            'money_O2': employee.money_O2,
+            'badge': employee.badge,
+        } for employee in employees]
+
+    @api.model
+    def _get_leaderboard_top(self):
+        """Return the first ``LEADERBOARD_TOP_SIZE`` entries of the leaderboard.
+
+        The result is cached until an employee is created, archived or
+        removed, the O2 of an employee in the top changes or the rank cron
+        moves ranks.
+        """
+        return LEADERBOARD_CACHE.get(self.env, self.env.lang, lambda: tuple(self._read_leaderboard(LEADERBOARD_TOP_SIZE)))
+
+    def _invalidate_leaderboard_top(self, previous_o2):
+        """Clear the cached top of the leaderboard if these employees, whose
+        O2 just changed, are part of it now or were before.
+
+        :param previous_o2: ``{employee_id: money_O2}`` before the change
+        """
+        self.flush_model(['money_O2', 'active'])
+        self.env.cr.execute(SQL("""
+            SELECT "money_O2"
+              FROM hr_employee
+             WHERE active
+          ORDER BY "money_O2" DESC, id DESC
+            OFFSET %s
+             LIMIT 1
+        """, LEADERBOARD_TOP_SIZE - 1))
+        row = self.env.cr.fetchone()
+        if not row or any(max(employee.money_O2, previous_o2[employee.id]) >= row[0] for employee in self):
+            LEADERBOARD_CACHE.invalidate(self.env)
+
+    leaderboard_rank = fields.Integer(string='Rank', readonly=True, copy=False, index=True, help='Rank in the leaderboard based on O2 currency')
 
 
 class HrEmployeePublic(models.Model):
@@ -68,6 +282,6 @@ class HrEmployeePublic(models.Model):
         ('bronze', 'Bronze'),
         ('silver', 'Silver'),
         ('gold', 'Gold'),
-    ], string='Badge', related='employee_id.badge', readonly=True)
+    ], string='Badge', readonly=True)
     money_O2 = fields.Float(string='Money O2', related='employee_id.money_O2', readonly=True)
 
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import _, api, models
+from odoo.tools import SQL
+
+
+class CSRHistoryExport(models.AbstractModel):
+    _name = 'csr.history.export'
+    _description = 'CSR Purchase and Completion History Export'
+
+    @api.model
+    def _get_export_header(self, kind):
+        if kind == 'purchases':
+            return [_('Purchase Date'), _('Employee'), _('Activity'), _('NGO'), _('XP Paid'), _('O2 Received'), _('Archived')]
+        return [_('Completion Date'), _('Employee'), _('Project'), _('NGO'), _('XP')]
+
+    @api.model
+    def _get_export_query(self, kind, ngo_ids=None, date_from=None, date_to=None):
+        """Return the query of a history export, names included, for the
+        purchases (archived ones too) or the project completions of the
+        given NGOs (all if ``None``) between two dates (inclusive).
+
+        The query only reads tables, so it can be run by a cursor that
+        outlives the request environment.
+        """
+        if kind == 'purchases':
+            return self._get_purchases_query(ngo_ids, date_from, date_to)
+        return self._get_completions_query(ngo_ids, date_from, date_to)
+
+    @api.model
+    def _get_date_conditions(self, column, date_from, date_to):
+        conditions = []
+        if date_from:
+            conditions.append(SQL("%s >= %s", column, date_from))
+        if date_to:
+            conditions.append(SQL("%s < %s", column, date_to + timedelta(days=1)))
+        return conditions
+
+    @api.model
+    def _get_purchases_query(self, ngo_ids, date_from, date_to):
+        self.env['csr.activity.purchase'].flush_model()
+        conditions = self._get_date_conditions(SQL.identifier('purchase_date'), date_from, date_to)
+        if ngo_ids is not None:
+            conditions.append(SQL("ngo_id IN %s", tuple(ngo_ids) or (None,)))
+        where = SQL(" AND ").join(conditions) if conditions else SQL("TRUE")
+        return SQL("""
+            SELECT purchase.purchase_date, employee.name, activity.name, ngo.name,
+                   purchase.xp_paid, purchase.o2_received, purchase.archived
+              FROM (
+                    SELECT purchase_date, employee_id, activity_id, ngo_id, xp_paid, o2_received, FALSE AS archived
+                      FROM csr_activity_purchase
+                     WHERE %(where)s
+                 UNION ALL
+                    SELECT purchase_date, employee_id, activity_id, ngo_id, xp_paid, o2_received, TRUE
+                      FROM csr_activity_purchase_archive
+                     WHERE %(where)s
+                   ) purchase
+              JOIN hr_employee employee ON employee.id = purchase.employee_id
+              JOIN csr_activity activity ON activity.id = purchase.activity_id
+         LEFT JOIN csr_ngo ngo ON ngo.id = purchase.ngo_id
+          ORDER BY purchase.purchase_date
+        """, where=where)
+
+    @api.model
+    def _get_completions_query(self, ngo_ids, date_from, date_to):
+        self.env['project.project'].flush_model(['ngo_id', 'completed_by_employee_ids'])
+        self.env['csr.points.ledger'].flush_model()
+        conditions = self._get_date_conditions(SQL.identifier('completion', 'date'), date_from, date_to)
+        if ngo_ids is not None:
+            conditions.append(SQL("project.ngo_id IN %s", tuple(ngo_ids) or (None,)))
+        where = SQL(" AND ").join(conditions) if conditions else SQL("TRUE")
+        # The completion date is stored on the completion, the XP comes from
+        # the ledger entry of the award (if the project awarded XP)
+        return SQL("""
+            SELECT completion.date, employee.name,
+                   COALESCE(project.name->>%(lang)s, project.name->>'en_US'), ngo.name, COALESCE(award.xp_delta, 0)
+              FROM project_employee_completion_rel completion
+              JOIN project_project project ON project.id = completion.project_id
+              JOIN hr_employee employee ON employee.id = completion.employee_id
+         LEFT JOIN csr_ngo ngo ON ngo.id = project.ngo_id
+         LEFT JOIN LATERAL (
+                    SELECT ledger.xp_delta
+                      FROM csr_points_ledger ledger
+                     WHERE ledger.employee_id = completion.employee_id
+                       AND ledger.project_id = completion.project_id
+                       AND ledger.reason = 'completion'
+                  ORDER BY ledger.id
+                     LIMIT 1
+                   ) award ON TRUE
+             WHERE %(where)s
+          ORDER BY completion.date
+        """, lang=self.env.lang or 'en_US', where=where)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Lengths of the leaderboard periods, named after their DATE_TRUNC field
+LEADERBOARD_PERIODS = {
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+}
+
+
+class CSRLeaderboardPeriod(models.Model):
+    _name = 'csr.leaderboard.period'
+    _description = 'CSR Leaderboard per Period'
+    _order = 'period_start desc, o2_received desc, employee_id'
+    _log_access = False
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, ondelete='cascade', index=True)
+    department_id = fields.Many2one('hr.department', string='Department', readonly=True, ondelete='set null', index='btree_not_null',
+                                    help='Department of the employee at their last purchase of the period')
+    period_type = fields.Selection([
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('quarter', 'Quarter'),
+    ], string='Period', required=True, readonly=True)
+    period_start = fields.Date(string='Period Start', required=True, readonly=True)
+    period_end = fields.Date(string='Period End', compute='_compute_period_end')
+    is_current = fields.Boolean(string='Current Period', compute='_compute_is_current', search='_search_is_current')
+    purchase_count = fields.Integer(string='Purchases', readonly=True, aggregator='sum')
+    o2_received = fields.Float(string='O2 Received', readonly=True, aggregator='sum')
+
+    _employee_period_uniq = models.Constraint(
+        'UNIQUE(employee_id, period_type, period_start)',
+        'There can be only one total per employee and period.',
+    )
+    _period_o2_idx = models.Index('(period_type, period_start, o2_received DESC)')
+
+    @api.depends('period_type', 'period_start')
+    def _compute_period_end(self):
+        for total in self:
+            total.period_end = total.period_start + LEADERBOARD_PERIODS[total.period_type] - relativedelta(days=1)
+
+    def _compute_is_current(self):
+        starts = self._get_current_starts()
+        for total in self:
+            total.is_current = total.period_start == starts[total.period_type]
+
+    def _search_is_current(self, operator, value):
+        if operator in ('in', 'not in'):
+            current = (operator == 'in') == (True in value)
+        elif operator in ('=', '!='):
+            current = (operator == '=') == bool(value)
+        else:
+            return NotImplemented
+        domain = ['|', '|']
+        for period_type, start in self._get_current_starts().items():
+            domain += ['&', ('period_type', '=', period_type), ('period_start', '=', start)]
+        return domain if current else ['!'] + domain
+
+    @api.model
+    def _get_current_starts(self):
+        """Return the first day of the current week, month and quarter, in
+        UTC like the purchase dates the periods are truncated from"""
+        today = fields.Date.today()
+        return {
+            'week': today - relativedelta(days=today.weekday()),
+            'month': today.replace(day=1),
+            'quarter': today.replace(day=1, month=(today.month - 1) // 3 * 3 + 1),
+        }
+
+    def init(self):
+        super().init()
+        # Backfill the totals from the existing purchases on installation
+        self.env.cr.execute(SQL("SELECT 1 FROM csr_leaderboard_period LIMIT 1"))
+        if not self.env.cr.rowcount:
+            self._add_purchases(SQL("""
+                SELECT employee_id, purchase_date, o2_received FROM csr_activity_purchase
+                 UNION ALL
+                SELECT employee_id, purchase_date, o2_received FROM csr_activity_purchase_archive
+            """))
+
+    @api.model
+    def _add_purchases(self, purchases_query, sign=1):
+        """Add (or, with ``sign=-1``, remove) purchases to the totals of
+        their periods, with one upsert for the three period types.
+
+        :param purchases_query: ``SQL`` selecting ``employee_id``,
+            ``purchase_date`` and ``o2_received``
+        """
+        self.env['hr.employee'].flush_model(['department_id'])
+        self.env.cr.execute(SQL("""
+            INSERT INTO csr_leaderboard_period AS total
+                   (employee_id, department_id, period_type, period_start, purchase_count, o2_received)
+            SELECT purchase.employee_id, MAX(employee.department_id), period.type,
+                   DATE_TRUNC(period.type, purchase.purchase_date)::date,
+                   %(sign)s * COUNT(*), %(sign)s * SUM(purchase.o2_received)
+              FROM (%(purchases)s) purchase
+              JOIN hr_employee employee ON employee.id = purchase.employee_id
+        CROSS JOIN UNNEST(%(period_types)s::varchar[]) AS period (type)
+          GROUP BY purchase.employee_id, period.type, DATE_TRUNC(period.type, purchase.purchase_date)::date
+                ON CONFLICT (employee_id, period_type, period_start) DO UPDATE
+               SET purchase_count = total.purchase_count + EXCLUDED.purchase_count,
+                   o2_received = total.o2_received + EXCLUDED.o2_received,
+                   department_id = CASE WHEN EXCLUDED.purchase_count > 0 THEN EXCLUDED.department_id
+                                        ELSE total.department_id END
+        """, purchases=purchases_query, sign=sign, period_types=list(LEADERBOARD_PERIODS)))
+        self.invalidate_model()
+
+    @api.model
+    def _get_top(self, period_type, limit=10):
+        """Return the best employees of the current period, best first"""
+        totals = self.search_fetch(
+            [('period_type', '=', period_type), ('period_start', '=', self._get_current_starts()[period_type])],
+            ['employee_id', 'department_id', 'purchase_count', 'o2_received'],
+            order='o2_received desc, employee_id', limit=limit,
+        )
+        return [{
+            'rank': rank,
+            'id': total.employee_id.id,
+            'name': total.employee_id.name,
+            'department': total.department_id.name or False,
+            'purchase_count': total.purchase_count,
+            'o2_received': total.o2_received,
+        } for rank, total in enumerate(totals, start=1)]
+
+    @api.model
+    def _get_department_ranking(self, period_type):
+        """Return the departments ranked by the O2 received by their
+        employees during the current period"""
+        groups = self._read_group(
+            [('period_type', '=', period_type), ('period_start', '=', self._get_current_starts()[period_type]),
+             ('department_id', '!=', False)],
+            ['department_id'], ['o2_received:sum', 'purchase_count:sum', '__count'],
+            order='o2_received:sum desc',
+        )
+        return [{
+            'rank': rank,
+            'id': department.id,
+            'name': department.name,
+            'employee_count': employee_count,
+            'purchase_count': purchase_count,
+            'o2_received': o2_received,
+        } for rank, (department, o2_received, purchase_count, employee_count) in enumerate(groups, start=1)]
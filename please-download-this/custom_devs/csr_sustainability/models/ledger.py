@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+
+class CSRPointsLedger(models.Model):
+    _name = 'csr.points.ledger'
+    _description = 'CSR XP/O2 Ledger Entry'
+    _order = 'date desc, id desc'
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, ondelete='cascade', index=True)
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now, readonly=True)
+    reason = fields.Selection([
+        ('purchase', 'Activity Purchase'),
+        ('completion', 'Project Completion'),
+        ('adjustment', 'Adjustment'),
+    ], string='Reason', required=True, default='adjustment')
+    xp_delta = fields.Integer(string='XP', help='XP (sustainability points) added to or removed from the employee')
+    o2_delta = fields.Float(string='O2', help='O2 added to or removed from the employee')
+    purchase_id = fields.Many2one('csr.activity.purchase', string='Purchase', ondelete='set null', index='btree_not_null', readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', ondelete='set null', index='btree_not_null', readonly=True)
+    note = fields.Char(string='Note')
+
+    def init(self):
+        super().init()
+        # Record an opening adjustment for balances that are not (or no longer)
+        # explained by the ledger, so that the employee balances stay its snapshot.
+        self.env.cr.execute(SQL("""
+            INSERT INTO csr_points_ledger (employee_id, date, reason, xp_delta, o2_delta, note,
+                                           create_uid, create_date, write_uid, write_date)
+            SELECT employee.id, NOW() AT TIME ZONE 'UTC', 'adjustment',
+                   COALESCE(employee.sustainability_points, 0) - COALESCE(ledger.xp, 0),
+                   COALESCE(employee."money_O2", 0) - COALESCE(ledger.o2, 0),
+                   'Opening balance',
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM hr_employee employee
+         LEFT JOIN (
+                    SELECT employee_id, SUM(xp_delta) AS xp, SUM(o2_delta) AS o2
+                      FROM csr_points_ledger
+                  GROUP BY employee_id
+                   ) ledger ON ledger.employee_id = employee.id
+             WHERE COALESCE(employee.sustainability_points, 0) != COALESCE(ledger.xp, 0)
+                OR ABS(COALESCE(employee."money_O2", 0) - COALESCE(ledger.o2, 0)) > 0.001
+        """, uid=self.env.uid))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        entries = super().create(vals_list)
+        entries._apply_to_balances()
+        return entries
+
+    def write(self, vals):
+        raise UserError(_('Ledger entries cannot be modified. Record an adjustment instead.'))
+
+    def unlink(self):
+        raise UserError(_('Ledger entries cannot be deleted. Record an adjustment instead.'))
+
+    def _apply_to_balances(self):
+        """Add the entries to the XP/O2 balances of their employees.
+
+        All the balances are updated by a single ``UPDATE`` that increments
+        the columns in place, with the XP check in its ``WHERE`` clause. The
+        rows are locked beforehand in id order, so that concurrent batches
+        on overlapping employees wait for each other instead of deadlocking.
+        Once the first transaction commits, the second one gets a
+        serialization failure (transactions run at REPEATABLE READ) and is
+        retried by the service layer, on the committed balances: a spending
+        never overwrites another one.
+
+        An employee without enough XP raises a ``UserError``, which rolls
+        back the ``UPDATE`` of the whole batch with the transaction.
+
+        Besides, only the ranks between the old and new O2 of the employees
+        are updated, and the cached top of the leaderboard is invalidated
+        when these employees are or were part of it.
+        """
+        deltas = defaultdict(lambda: [0, 0.0])
+        for entry in self:
+            deltas[entry.employee_id.id][0] += entry.xp_delta
+            deltas[entry.employee_id.id][1] += entry.o2_delta
+        deltas = {employee_id: (xp, o2) for employee_id, (xp, o2) in sorted(deltas.items()) if xp or o2}
+        if not deltas:
+            return
+        employees = self.env['hr.employee'].browse(deltas)
+        employees.flush_recordset(['sustainability_points', 'money_O2'])
+        self.env.cr.execute(SQL(
+            "SELECT id FROM hr_employee WHERE id IN %s ORDER BY id FOR NO KEY UPDATE",
+            tuple(deltas),
+        ))
+        self.env.cr.execute(SQL("""
+            UPDATE hr_employee employee
+               SET sustainability_points = COALESCE(employee.sustainability_points, 0) + delta.xp,
+                   "money_O2" = COALESCE(employee."money_O2", 0) + delta.o2
+              FROM (VALUES %s) AS delta (id, xp, o2)
+             WHERE employee.id = delta.id
+               AND (delta.xp >= 0 OR COALESCE(employee.sustainability_points, 0) + delta.xp >= 0)
+         RETURNING employee.id, employee."money_O2"
+        """, SQL(', ').join(
+            SQL('(%s, %s, %s::float8)', employee_id, xp, o2)
+            for employee_id, (xp, o2) in deltas.items()
+        )))
+        balances = dict(self.env.cr.fetchall())
+        if missing := employees.filtered(lambda employee: employee.id not in balances):
+            raise UserError(_('Not enough XP: %s cannot afford this.', ', '.join(missing.sudo().mapped('name'))))
+        employees.invalidate_recordset(['sustainability_points', 'money_O2'])
+        employees.modified(['sustainability_points', 'money_O2'])
+        if o2_changed := employees.filtered(lambda employee: deltas[employee.id][1]):
+            previous_o2 = {employee.id: balances[employee.id] - deltas[employee.id][1] for employee in o2_changed}
+            o2_changed._update_leaderboard_rank(previous_o2)
+            o2_changed._invalidate_leaderboard_top(previous_o2)
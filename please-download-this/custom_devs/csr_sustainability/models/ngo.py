@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models
 
+from .activity import CATALOGUE_CACHE
+from .cache import values_changed
+
 
 class NGO(models.Model):
     _name = 'csr.ngo'
@@ -8,21 +11,52 @@ class NGO(models.Model):
     _order = 'name'
     _rec_name = 'name'
 
-    name = fields.Char(string='NGO Name', required=True)
-    user_id = fields.Many2one('res.users', string='Login User', required=True, help='User account for this NGO to log in and create projects')
+    name = fields.Char(string='NGO Name', required=True, index='trigram')
+    user_id = fields.Many2one('res.users', string='Login User', required=True, index=True, help='User account for this NGO to log in and create projects')
     project_ids = fields.One2many('project.project', 'ngo_id', string='Projects')
-    project_count = fields.Integer(string='Project Count', compute='_compute_project_count')
+    project_count = fields.Integer(string='Project Count', compute='_compute_project_count', store=True)
     activity_ids = fields.One2many('csr.activity', 'ngo_id', string='Activities')
-    activity_count = fields.Integer(string='Activity Count', compute='_compute_activity_count')
+    activity_count = fields.Integer(string='Activity Count', compute='_compute_activity_count', store=True)
     active = fields.Boolean(string='Active', default=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        ngos = super().create(vals_list)
+        # res.users._get_csr_identity_ids caches the NGO of each user
+        self.env.registry.clear_cache()
+        # and the catalogue the NGO names
+        CATALOGUE_CACHE.invalidate(self.env)
+        return ngos
+
+    def write(self, vals):
+        identity_changed = values_changed(self, vals, ('user_id', 'active'))
+        catalogue_changed = values_changed(self, vals, ('name', 'active'))
+        res = super().write(vals)
+        if identity_changed:
+            self.env.registry.clear_cache()
+        if catalogue_changed:
+            CATALOGUE_CACHE.invalidate(self.env)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        CATALOGUE_CACHE.invalidate(self.env)
+        return res
     
-    @api.depends('project_ids')
+    @api.depends('project_ids', 'project_ids.active')
     def _compute_project_count(self):
+        project_counts = dict(self.env['project.project']._read_group(
+            [('ngo_id', 'in', self.ids)], ['ngo_id'], ['__count'],
+        ))
         for ngo in self:
-            ngo.project_count = len(ngo.project_ids)
+            ngo.project_count = project_counts.get(ngo._origin, 0)
     
-    @api.depends('activity_ids')
+    @api.depends('activity_ids', 'activity_ids.active')
     def _compute_activity_count(self):
+        activity_counts = dict(self.env['csr.activity']._read_group(
+            [('ngo_id', 'in', self.ids)], ['ngo_id'], ['__count'],
+        ))
         for ngo in self:
-            ngo.activity_count = len(ngo.activity_ids)
+            ngo.activity_count = activity_counts.get(ngo._origin, 0)
 
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Fields of the projects copied, or counted, into their participation snapshot
+IMPACT_PROJECT_FIELDS = ('is_sustainability', 'ngo_id', 'employee_ids', 'completed_by_employee_ids')
+
+
+class CSRActivityPurchaseQueue(models.Model):
+    _inherit = 'csr.activity.purchase.queue'
+
+    summary = fields.Selection(selection_add=[('impact', 'NGO Impact')], ondelete={'impact': 'cascade'})
+
+
+class ProjectProject(models.Model):
+    _inherit = 'project.project'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super().create(vals_list)
+        self.env['csr.ngo.impact.project.queue'].sudo()._enqueue(projects.filtered('is_sustainability'))
+        return projects
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(fname in vals for fname in IMPACT_PROJECT_FIELDS):
+            self.env['csr.ngo.impact.project.queue'].sudo()._enqueue(self)
+        return res
+
+    def _recount_participation(self):
+        projects = super()._recount_participation()
+        # All the projects are only recounted by the init of project.project,
+        # which may run before the queue table exists
+        if self:
+            self.env['csr.ngo.impact.project.queue'].sudo()._enqueue(projects)
+        return projects
+
+
+class CSRNgoImpactDaily(models.Model):
+    _name = 'csr.ngo.impact.daily'
+    _description = 'NGO Impact per Activity and Day'
+    _order = 'day desc, activity_id'
+    _log_access = False
+
+    ngo_id = fields.Many2one('csr.ngo', string='NGO', required=True, readonly=True, ondelete='cascade', index=True)
+    activity_id = fields.Many2one('csr.activity', string='Activity', required=True, readonly=True, ondelete='cascade')
+    day = fields.Date(string='Day', required=True, readonly=True)
+    purchase_count = fields.Integer(string='Purchases', readonly=True, aggregator='sum')
+    o2_received = fields.Float(string='O2 Distributed', readonly=True, aggregator='sum')
+
+    _ngo_activity_day_uniq = models.Constraint(
+        'UNIQUE(ngo_id, activity_id, day)',
+        'There can be only one daily total per NGO and activity.',
+    )
+    _ngo_day_idx = models.Index('(ngo_id, day)')
+
+    @api.model
+    def _refresh_purchases(self):
+        """Add the purchases queued since the last refresh to the daily totals
+        and to the employees reached by each NGO"""
+        self.env['csr.activity.purchase'].flush_model()
+        self.env.cr.execute(SQL("""
+            WITH queued AS (%(queued)s),
+            purchase AS (
+                SELECT purchase.*
+                  FROM csr_activity_purchase purchase
+                  JOIN queued ON queued.purchase_id = purchase.id
+            ),
+            daily_totals AS (
+                INSERT INTO csr_ngo_impact_daily AS daily (ngo_id, activity_id, day, purchase_count, o2_received)
+                SELECT ngo_id, activity_id, purchase_date::date, COUNT(*), SUM(o2_received)
+                  FROM purchase
+              GROUP BY ngo_id, activity_id, purchase_date::date
+                    ON CONFLICT (ngo_id, activity_id, day) DO UPDATE
+                   SET purchase_count = daily.purchase_count + EXCLUDED.purchase_count,
+                       o2_received = daily.o2_received + EXCLUDED.o2_received
+            )
+            INSERT INTO csr_ngo_impact_reach AS reach (ngo_id, employee_id, first_purchase_date, purchase_count)
+            SELECT ngo_id, employee_id, MIN(purchase_date), COUNT(*)
+              FROM purchase
+          GROUP BY ngo_id, employee_id
+                ON CONFLICT (ngo_id, employee_id) DO UPDATE
+               SET first_purchase_date = LEAST(reach.first_purchase_date, EXCLUDED.first_purchase_date),
+                   purchase_count = reach.purchase_count + EXCLUDED.purchase_count
+        """, queued=self.env['csr.activity.purchase.queue']._dequeue('impact')))
+        self.invalidate_model()
+        self.env['csr.ngo.impact.reach'].invalidate_model()
+
+    @api.model
+    def _subtract_purchases(self, purchases):
+        """Remove deleted purchases from the daily totals. The employees stay
+        counted as reached by the NGO."""
+        purchases = self.env['csr.activity.purchase.queue']._filter_summarized(purchases, 'impact')
+        if not purchases:
+            return
+        purchases.flush_recordset()
+        self.env.cr.execute(SQL("""
+            UPDATE csr_ngo_impact_daily daily
+               SET purchase_count = daily.purchase_count - purchase.count,
+                   o2_received = daily.o2_received - purchase.o2_received
+              FROM (
+                    SELECT ngo_id, activity_id, purchase_date::date AS day,
+                           COUNT(*), SUM(o2_received) AS o2_received
+                      FROM csr_activity_purchase
+                     WHERE id IN %s
+                  GROUP BY ngo_id, activity_id, purchase_date::date
+                   ) purchase
+             WHERE daily.ngo_id = purchase.ngo_id
+               AND daily.activity_id = purchase.activity_id
+               AND daily.day = purchase.day
+        """, tuple(purchases.ids)))
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh_impact(self):
+        self._refresh_purchases()
+        self.env['csr.ngo.impact.project']._refresh_projects()
+
+
+class CSRNgoImpactReach(models.Model):
+    _name = 'csr.ngo.impact.reach'
+    _description = 'Employees Reached by an NGO'
+    _order = 'first_purchase_date desc'
+    _log_access = False
+
+    ngo_id = fields.Many2one('csr.ngo', string='NGO', required=True, readonly=True, ondelete='cascade')
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, ondelete='cascade', index=True)
+    first_purchase_date = fields.Datetime(string='First Purchase', readonly=True)
+    purchase_count = fields.Integer(string='Purchases', readonly=True, aggregator='sum')
+
+    _ngo_employee_uniq = models.Constraint(
+        'UNIQUE(ngo_id, employee_id)',
+        'An employee can be reached only once by an NGO.',
+    )
+
+
+class CSRNgoImpactProjectQueue(models.Model):
+    _name = 'csr.ngo.impact.project.queue'
+    _description = 'Project Left to Snapshot in the NGO Impact'
+    _order = 'id'
+    _log_access = False
+
+    project_id = fields.Many2one('project.project', string='Project', required=True, readonly=True, ondelete='cascade')
+
+    @api.model
+    def _enqueue(self, projects):
+        """Queue projects whose participation changed. A project may be
+        queued several times: its rows are taken together, and concurrent
+        transactions queuing it never wait for each other."""
+        if projects:
+            self.env.cr.execute(SQL(
+                "INSERT INTO csr_ngo_impact_project_queue (project_id) SELECT UNNEST(%s)",
+                projects.ids,
+            ))
+
+    @api.model
+    def _dequeue(self):
+        """Return the query taking the queued projects out of the queue, as a
+        ``project_id`` column for a ``WITH`` clause"""
+        return SQL("DELETE FROM csr_ngo_impact_project_queue RETURNING project_id")
+
+
+class CSRNgoImpactProject(models.Model):
+    _name = 'csr.ngo.impact.project'
+    _description = 'NGO Project Participation'
+    _order = 'participant_count desc, project_id'
+    _log_access = False
+
+    project_id = fields.Many2one('project.project', string='Project', required=True, readonly=True, ondelete='cascade')
+    ngo_id = fields.Many2one('csr.ngo', string='NGO', required=True, readonly=True, ondelete='cascade', index=True)
+    participant_count = fields.Integer(string='Participants', readonly=True, aggregator='sum')
+    completion_count = fields.Integer(string='Completions', readonly=True, aggregator='sum')
+
+    _project_uniq = models.Constraint(
+        'UNIQUE(project_id)',
+        'There can be only one participation snapshot per project.',
+    )
+
+    @api.model
+    def _refresh_projects(self):
+        """Snapshot the participation of the projects queued since the last
+        refresh. Only the queue rows of committed transactions are taken, so
+        the snapshot reads the projects as those transactions left them."""
+        self.env['project.project'].flush_model(['is_sustainability', 'ngo_id', 'participant_count', 'completion_count'])
+        self.env.cr.execute(SQL("""
+            WITH queued AS (%(queued)s),
+            changed AS (
+                SELECT id, ngo_id, is_sustainability, participant_count, completion_count
+                  FROM project_project
+                 WHERE id IN (SELECT project_id FROM queued)
+            ),
+            removed AS (
+                DELETE FROM csr_ngo_impact_project snapshot
+                 USING changed
+                 WHERE snapshot.project_id = changed.id
+                   AND (NOT changed.is_sustainability OR changed.ngo_id IS NULL)
+            )
+            INSERT INTO csr_ngo_impact_project AS snapshot
+                   (project_id, ngo_id, participant_count, completion_count)
+            SELECT changed.id, changed.ngo_id, COALESCE(changed.participant_count, 0),
+                   COALESCE(changed.completion_count, 0)
+              FROM changed
+             WHERE changed.is_sustainability AND changed.ngo_id IS NOT NULL
+                ON CONFLICT (project_id) DO UPDATE
+               SET ngo_id = EXCLUDED.ngo_id,
+                   participant_count = EXCLUDED.participant_count,
+                   completion_count = EXCLUDED.completion_count
+        """, queued=self.env['csr.ngo.impact.project.queue']._dequeue()))
+        self.invalidate_model()
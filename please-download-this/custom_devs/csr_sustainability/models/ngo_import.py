@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+from itertools import islice
+
+import psycopg2
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 500
+
+# Columns of the import files; the required ones must be present
+IMPORT_COLUMNS = {
+    'activities': {
+        'required': ('name', 'xp', 'value'),
+        'optional': ('description',),
+    },
+    'projects': {
+        'required': ('name',),
+        'optional': ('description', 'xp', 'date_start', 'date'),
+    },
+}
+
+
+class CSRNgoImport(models.AbstractModel):
+    _name = 'csr.ngo.import'
+    _description = 'NGO Bulk Import of Activities and Projects'
+
+    @api.model
+    def _read_rows(self, file, filename):
+        """Yield the lower-cased header of an uploaded CSV or XLSX file, then
+        its rows as ``(row number, values)``, keyed by the header. Cells
+        missing at the end of a row are left out of its values. The file is
+        read as a stream, one row at a time."""
+        if filename.lower().endswith('.xlsx'):
+            if openpyxl is None:
+                raise UserError(_('Reading XLSX files requires the openpyxl library. Please upload a CSV file.'))
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+                yield header
+                for row_number, row in enumerate(rows, start=2):
+                    if any(cell not in (None, '') for cell in row):
+                        yield row_number, dict(zip(header, row))
+            finally:
+                workbook.close()
+        elif filename.lower().endswith('.csv'):
+            reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+            header = [column.strip().lower() for column in next(reader, ())]
+            yield header
+            for row_number, row in enumerate(reader, start=2):
+                if any(cell.strip() for cell in row):
+                    yield row_number, dict(zip(header, row))
+        else:
+            raise UserError(_('Please upload a CSV or XLSX file.'))
+
+    @api.model
+    def _text(self, row, column):
+        value = row.get(column)
+        return str(value).strip() if value is not None else ''
+
+    @api.model
+    def _number(self, row, column, required=False):
+        text = self._text(row, column)
+        if not text:
+            if required:
+                raise UserError(_('The column "%s" is required.', column))
+            return 0.0
+        try:
+            number = float(text.replace(',', '.'))
+        except ValueError:
+            raise UserError(_('"%(value)s" is not a valid number for "%(column)s".', value=text, column=column))
+        if number < 0:
+            raise UserError(_('The column "%s" cannot be negative.', column))
+        return number
+
+    @api.model
+    def _date(self, row, column):
+        value = row.get(column)
+        if value in (None, ''):
+            return False
+        try:
+            return fields.Date.to_date(value if not isinstance(value, str) else value.strip())
+        except ValueError:
+            raise UserError(_('"%(value)s" is not a valid date for "%(column)s", use YYYY-MM-DD.', value=value, column=column))
+
+    @api.model
+    def _prepare_activities_vals(self, ngo, row):
+        if not self._text(row, 'name'):
+            raise UserError(_('The column "%s" is required.', 'name'))
+        return {
+            'name': self._text(row, 'name'),
+            'description': self._text(row, 'description'),
+            'xp': self._number(row, 'xp', required=True),
+            'value': self._number(row, 'value', required=True),
+            'ngo_id': ngo.id,
+            'active': True,
+        }
+
+    @api.model
+    def _prepare_projects_vals(self, ngo, row):
+        if not self._text(row, 'name'):
+            raise UserError(_('The column "%s" is required.', 'name'))
+        return {
+            'name': self._text(row, 'name'),
+            'description': self._text(row, 'description'),
+            'date_start': self._date(row, 'date_start'),
+            'date': self._date(row, 'date'),
+            'xp': self._number(row, 'xp'),
+            'ngo_id': ngo.id,
+            'is_sustainability': True,
+        }
+
+    @api.model
+    def _import(self, ngo, kind, file, filename):
+        """Create the activities or projects (``kind``) of an uploaded file
+        for ``ngo``.
+
+        The rows are validated and created by chunks of ``IMPORT_BATCH_SIZE``
+        with one ``create`` per chunk; when a chunk fails, its rows are
+        created one by one to report the faulty ones. The cache is emptied
+        after each chunk so that memory does not grow with the file.
+
+        :return: a dict with the number of ``created`` records, the total
+            ``error_count`` and the first ``errors`` as ``(row, message)``
+        """
+        report = {'created': 0, 'error_count': 0, 'errors': []}
+        Model = self.env['csr.activity' if kind == 'activities' else 'project.project'].sudo()
+        prepare_vals = getattr(self, f'_prepare_{kind}_vals')
+        rows = self._read_rows(file, filename)
+        header = next(rows)
+        if not any(header):
+            raise UserError(_('The file is empty.'))
+        if missing := [column for column in IMPORT_COLUMNS[kind]['required'] if column not in header]:
+            raise UserError(_('Missing columns: %s', ', '.join(missing)))
+
+        while chunk := list(islice(rows, IMPORT_BATCH_SIZE)):
+            batch = []
+            for row_number, row in chunk:
+                try:
+                    batch.append((row_number, prepare_vals(ngo, row)))
+                except UserError as error:
+                    self._report_error(report, row_number, error.args[0])
+            self._create_batch(Model, batch, report)
+        return report
+
+    @api.model
+    def _create_batch(self, Model, batch, report):
+        if not batch:
+            return
+        try:
+            with self.env.cr.savepoint():
+                Model.create([vals for _row_number, vals in batch])
+            report['created'] += len(batch)
+        except (UserError, ValueError, psycopg2.Error):
+            for row_number, vals in batch:
+                try:
+                    with self.env.cr.savepoint():
+                        Model.create(vals)
+                    report['created'] += 1
+                except UserError as error:
+                    self._report_error(report, row_number, error.args[0])
+                except (ValueError, psycopg2.Error) as error:
+                    self._report_error(report, row_number, str(error).strip())
+        self.env.invalidate_all()
+
+    @api.model
+    def _report_error(self, report, row_number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append((row_number, message))
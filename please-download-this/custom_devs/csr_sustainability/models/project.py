@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models
+from odoo import Command, api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import column_exists, create_index, table_exists
+
+
+# Relations counted on projects: field, table, project column, employee column, counter
+PARTICIPATION_RELATIONS = (
+    ('employee_ids', 'hr_employee_project_project_rel', 'project_project_id', 'hr_employee_id', 'participant_count'),
+    ('completed_by_employee_ids', 'project_employee_completion_rel', 'project_id', 'employee_id', 'completion_count'),
+)
 
 
 class ProjectProject(models.Model):
@@ -7,55 +16,238 @@ class ProjectProject(models.Model):
     
     is_sustainability = fields.Boolean(string='Sustainability Project', default=False, help='Mark this project as part of the Sustainability app')
     ngo_id = fields.Many2one('csr.ngo', string='NGO', help='NGO associated with this project', index=True)
-    employee_ids = fields.Many2many('hr.employee', string='Employees', help='Employees associated with this project')
+    # the name is already trigram-indexed by project; both are searched from the portal
+    description = fields.Html(index='trigram')
+    employee_ids = fields.Many2many('hr.employee', 'hr_employee_project_project_rel', 'project_project_id', 'hr_employee_id',
+                                    string='Employees', help='Employees associated with this project')
     completed_by_employee_ids = fields.Many2many('hr.employee', 'project_employee_completion_rel', 'project_id', 'employee_id', 
                                                   string='Completed By', help='Employees who have completed this project')
     xp = fields.Float(string='XP (Experience Points)', default=0.0, help='Experience points that employees can earn by completing this project')
     can_mark_done = fields.Boolean(string='Can Mark Done', compute='_compute_can_mark_done', help='Whether the current employee can mark this project as done')
+    participant_count = fields.Integer(string='Participants', readonly=True, copy=False, help='Number of employees who joined this project')
+    completion_count = fields.Integer(string='Completions', readonly=True, copy=False, help='Number of employees who completed this project')
+    completion_ratio = fields.Float(string='Completion (%)', compute='_compute_completion_ratio', store=True, aggregator='avg',
+                                    help='Share of the participants who completed this project')
     project_status = fields.Selection([
         ('not_started', 'Not Started'),
         ('in_progress', 'In Progress'),
         ('done', 'Done'),
     ], string='Project Status', compute='_compute_project_status', store=True, help='Status of the project based on employee participation')
     
-    @api.depends('employee_ids', 'completed_by_employee_ids', 'is_sustainability')
+    def init(self):
+        super().init()
+        # Covering index to list the projects of an employee from the relation
+        # table; the ORM creates an equivalent one only along with the table.
+        self.env.cr.execute(SQL(
+            "SELECT 1 FROM pg_indexes WHERE tablename = %s AND indexdef LIKE %s",
+            'hr_employee_project_project_rel', '%(hr_employee_id, project_project_id)',
+        ))
+        if not self.env.cr.rowcount:
+            create_index(self.env.cr, 'hr_employee_project_project_rel_employee_project_idx',
+                         'hr_employee_project_project_rel', ['hr_employee_id', 'project_project_id'])
+        # Date of each completion, filled by the database when the completion
+        # is linked; the existing ones take the date of their XP award, or
+        # of the last update of their project when they awarded none. The
+        # ledger is created after the projects on installation.
+        if not column_exists(self.env.cr, 'project_employee_completion_rel', 'date'):
+            award_date = SQL("NULL")
+            if table_exists(self.env.cr, 'csr_points_ledger'):
+                award_date = SQL("""(
+                    SELECT MIN(ledger.date)
+                      FROM csr_points_ledger ledger
+                     WHERE ledger.employee_id = completion.employee_id
+                       AND ledger.project_id = completion.project_id
+                       AND ledger.reason = 'completion'
+                )""")
+            self.env.cr.execute(SQL("""
+                ALTER TABLE project_employee_completion_rel ADD COLUMN date timestamp;
+                UPDATE project_employee_completion_rel completion
+                   SET date = COALESCE(%s, project.write_date, NOW() AT TIME ZONE 'UTC')
+                  FROM project_project project
+                 WHERE project.id = completion.project_id;
+                ALTER TABLE project_employee_completion_rel
+                      ALTER COLUMN date SET DEFAULT (NOW() AT TIME ZONE 'UTC'),
+                      ALTER COLUMN date SET NOT NULL;
+            """, award_date))
+        # Fill the participation counters of existing projects
+        self.browse()._recount_participation()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super().create(vals_list)
+        if any(vals.get('employee_ids') or vals.get('completed_by_employee_ids') for vals in vals_list):
+            projects._recount_participation()
+        return projects
+
+    def write(self, vals):
+        """Keep the participation counters up to date: linking or unlinking
+        participants and completions adds their count difference to the
+        counters, any other change of the relations recounts them."""
+        deltas = {}
+        recount = False
+        for fname, relation, project_column, employee_column, counter in PARTICIPATION_RELATIONS:
+            if fname not in vals:
+                continue
+            commands = vals[fname] or []
+            if not all(isinstance(command, (list, tuple)) for command in commands):
+                recount = True
+                continue
+            linked = [command[1] for command in commands if command[0] == Command.LINK]
+            unlinked = [command[1] for command in commands if command[0] == Command.UNLINK]
+            if len(linked) + len(unlinked) != len(commands) or len(set(linked + unlinked)) != len(linked + unlinked):
+                recount = True
+                continue
+            if not self.ids:
+                continue
+            # Only the links that do not exist yet and the unlinks of existing ones count
+            self.flush_model([fname])
+            self.env.cr.execute(SQL(
+                "SELECT %s, %s FROM %s WHERE %s IN %s AND %s IN %s",
+                SQL.identifier(project_column), SQL.identifier(employee_column), SQL.identifier(relation),
+                SQL.identifier(project_column), tuple(self.ids), SQL.identifier(employee_column), tuple(linked + unlinked) or (None,),
+            ))
+            existing = set(self.env.cr.fetchall())
+            for project_id in self.ids:
+                delta = (
+                    sum(1 for employee_id in linked if (project_id, employee_id) not in existing)
+                    - sum(1 for employee_id in unlinked if (project_id, employee_id) in existing)
+                )
+                if delta:
+                    deltas.setdefault(project_id, dict.fromkeys(('participant_count', 'completion_count'), 0))[counter] += delta
+        res = super().write(vals)
+        if recount:
+            self._recount_participation()
+        elif deltas:
+            self.flush_model(['participant_count', 'completion_count'])
+            self.env.cr.execute(SQL("""
+                UPDATE project_project project
+                   SET participant_count = COALESCE(project.participant_count, 0) + delta.participants,
+                       completion_count = COALESCE(project.completion_count, 0) + delta.completions
+                  FROM (VALUES %s) AS delta (id, participants, completions)
+                 WHERE project.id = delta.id
+            """, SQL(', ').join(
+                SQL('(%s, %s, %s)', project_id, delta['participant_count'], delta['completion_count'])
+                for project_id, delta in deltas.items()
+            )))
+            projects = self.browse(deltas)
+            projects.invalidate_recordset(['participant_count', 'completion_count'])
+            projects.modified(['participant_count', 'completion_count'])
+        return res
+
+    def _recount_participation(self):
+        """Recount the participants and completions of the projects (all of
+        them on an empty recordset) from the relation tables
+
+        :return: the projects whose counters changed
+        """
+        self.flush_model(['employee_ids', 'completed_by_employee_ids'])
+        self.env.cr.execute(SQL("""
+            WITH counts AS (
+                SELECT project.id,
+                       (SELECT COUNT(*) FROM hr_employee_project_project_rel member
+                         WHERE member.project_project_id = project.id) AS participants,
+                       (SELECT COUNT(*) FROM project_employee_completion_rel completion
+                         WHERE completion.project_id = project.id) AS completions
+                  FROM project_project project
+                 WHERE %s
+            )
+            UPDATE project_project project
+               SET participant_count = counts.participants,
+                   completion_count = counts.completions
+              FROM counts
+             WHERE project.id = counts.id
+               AND (project.participant_count IS DISTINCT FROM counts.participants
+                    OR project.completion_count IS DISTINCT FROM counts.completions)
+         RETURNING project.id
+        """, SQL("project.id IN %s", tuple(self.ids)) if self else SQL("TRUE")))
+        projects = self.browse([row[0] for row in self.env.cr.fetchall()])
+        projects.invalidate_recordset(['participant_count', 'completion_count'])
+        projects.modified(['participant_count', 'completion_count'])
+        return projects
+
+    @api.depends('participant_count', 'completion_count')
+    def _compute_completion_ratio(self):
+        for project in self:
+            project.completion_ratio = 100.0 * project.completion_count / project.participant_count if project.participant_count else 0.0
+
+    @api.depends('participant_count', 'completion_count', 'is_sustainability')
     def _compute_project_status(self):
         """Compute project status based on employee participation"""
         for project in self:
             if not project.is_sustainability:
                 project.project_status = False
-            elif not project.employee_ids:
+            elif not project.participant_count:
                 project.project_status = 'not_started'
-            elif project.completed_by_employee_ids:
+            elif project.completion_count:
                 project.project_status = 'done'
             else:
                 project.project_status = 'in_progress'
     
-    @api.depends('employee_ids', 'completed_by_employee_ids', 'is_sustainability')
+    @api.depends('participant_count', 'completion_count', 'is_sustainability')
+    @api.depends_context('uid')
     def _compute_can_mark_done(self):
-        """Compute if current employee can mark this project as done"""
-        employee = self.env['hr.employee'].sudo().search([('user_id', '=', self.env.user.id)], limit=1)
+        """Compute if current employee can mark this project as done, with
+        one query on the relation tables for the whole recordset"""
+        employee = self.env.user._get_csr_identity()[1]
+        project_ids = set()
+        if employee and self.ids:
+            self.flush_model(['employee_ids', 'completed_by_employee_ids'])
+            # Can mark done if employee is in project and hasn't completed it (or queued its completion)
+            self.env.cr.execute(SQL("""
+                SELECT member.project_project_id
+                  FROM hr_employee_project_project_rel member
+                 WHERE member.hr_employee_id = %(employee_id)s
+                   AND member.project_project_id IN %(project_ids)s
+                   AND NOT EXISTS (
+                        SELECT 1
+                          FROM project_employee_completion_rel completion
+                         WHERE completion.project_id = member.project_project_id
+                           AND completion.employee_id = member.hr_employee_id
+                   )
+                   AND NOT EXISTS (
+                        SELECT 1
+                          FROM csr_award_queue award
+                         WHERE award.project_id = member.project_project_id
+                           AND award.employee_id = member.hr_employee_id
+                   )
+            """, employee_id=employee.id, project_ids=tuple(self.ids)))
+            project_ids = {row[0] for row in self.env.cr.fetchall()}
         for project in self:
-            if not project.is_sustainability or not employee:
-                project.can_mark_done = False
-            else:
-                # Can mark done if employee is in project and hasn't completed it
-                project.can_mark_done = (
-                    employee.id in project.employee_ids.ids and 
-                    employee.id not in project.completed_by_employee_ids.ids
-                )
+            project.can_mark_done = project.is_sustainability and project._origin.id in project_ids
     
+    def _get_employee_participation(self, employee):
+        """Return whether ``employee`` is a participant of this project and
+        whether they completed it, without loading the participants. A
+        completion still in the award queue counts as done."""
+        self.ensure_one()
+        self.flush_model(['employee_ids', 'completed_by_employee_ids'])
+        self.env.cr.execute(SQL("""
+            SELECT EXISTS (
+                        SELECT 1 FROM hr_employee_project_project_rel
+                         WHERE project_project_id = %(project_id)s AND hr_employee_id = %(employee_id)s
+                   ),
+                   EXISTS (
+                        SELECT 1 FROM project_employee_completion_rel
+                         WHERE project_id = %(project_id)s AND employee_id = %(employee_id)s
+                         UNION ALL
+                        SELECT 1 FROM csr_award_queue
+                         WHERE project_id = %(project_id)s AND employee_id = %(employee_id)s
+                   )
+        """, project_id=self.id, employee_id=employee.id))
+        return self.env.cr.fetchone()
+
     def action_mark_done(self):
         """Mark this project as done for the current employee and award XP"""
         self.ensure_one()
-        employee = self.env['hr.employee'].sudo().search([('user_id', '=', self.env.user.id)], limit=1)
+        employee = self.env.user._get_csr_identity()[1]
         if not employee:
             raise ValueError("No employee record found for the current user")
         
-        if employee not in self.employee_ids:
+        is_employee_in_project, is_completed = self._get_employee_participation(employee)
+        if not is_employee_in_project:
             raise ValueError("You must be a member of this project to mark it as done")
         
-        if employee in self.completed_by_employee_ids:
+        if is_completed:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -67,16 +259,31 @@ class ProjectProject(models.Model):
                 }
             }
         
-        # Add employee to completed list
-        self.sudo().write({
-            'completed_by_employee_ids': [(4, employee.id)]
-        })
+        # Add employee to completed list and award XP
+        if not self._complete_for_employees(employee):
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Info',
+                    'message': 'You have already marked this project as done.',
+                    'type': 'warning',
+                    'sticky': False,
+                }
+            }
         
-        # Award XP to employee
-        if self.xp > 0:
-            employee.sudo().write({
-                'sustainability_points': employee.sustainability_points + int(self.xp)
-            })
+        if self.xp > 0 and self.env['csr.award.queue']._is_enabled():
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Success',
+                    'message': f'Project marked as done! Your {int(self.xp)} XP will be credited in a few seconds.',
+                    'type': 'success',
+                    'sticky': False,
+                }
+            }
+        elif self.xp > 0:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -99,6 +306,56 @@ class ProjectProject(models.Model):
                 }
             }
     
+    def _complete_for_employees(self, employees):
+        """Mark this project as done for the given employees and award its XP.
+
+        Employees who are not members of the project or have already
+        completed it are skipped. The completions are added with a single
+        write and the XP is awarded with a single grouped ledger update, or
+        both are left to the award queue cron when awards are queued.
+
+        :return: the employees the project was completed for
+        """
+        self.ensure_one()
+        if not employees:
+            return employees
+        self.flush_model(['employee_ids', 'completed_by_employee_ids'])
+        self.env.cr.execute(SQL("""
+            SELECT member.hr_employee_id
+              FROM hr_employee_project_project_rel member
+             WHERE member.project_project_id = %(project_id)s
+               AND member.hr_employee_id IN %(employee_ids)s
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM project_employee_completion_rel completion
+                     WHERE completion.project_id = member.project_project_id
+                       AND completion.employee_id = member.hr_employee_id
+               )
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM csr_award_queue award
+                     WHERE award.project_id = member.project_project_id
+                       AND award.employee_id = member.hr_employee_id
+               )
+        """, project_id=self.id, employee_ids=tuple(employees.ids)))
+        employees = employees.browse([row[0] for row in self.env.cr.fetchall()])
+        if not employees:
+            return employees
+        if self.env['csr.award.queue']._is_enabled():
+            self.env['csr.award.queue'].sudo()._enqueue(self, employees)
+            return employees
+        self.sudo().write({
+            'completed_by_employee_ids': [Command.link(employee_id) for employee_id in employees.ids]
+        })
+        if self.xp > 0:
+            self.env['csr.points.ledger'].sudo().create([{
+                'employee_id': employee_id,
+                'reason': 'completion',
+                'xp_delta': int(self.xp),
+                'project_id': self.id,
+            } for employee_id in employees.ids])
+        return employees
+
     @api.depends('ngo_id', 'ngo_id.user_id')
     def _compute_ngo_user_id(self):
         """Compute the NGO user ID for record rule filtering"""
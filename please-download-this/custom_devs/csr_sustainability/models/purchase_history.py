@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class CSRActivityPurchaseQueue(models.Model):
+    _name = 'csr.activity.purchase.queue'
+    _description = 'CSR Activity Purchase Left to Summarize'
+    _order = 'id'
+    _log_access = False
+
+    purchase_id = fields.Many2one('csr.activity.purchase', string='Purchase', required=True, readonly=True, ondelete='cascade')
+    summary = fields.Selection([
+        ('monthly', 'Monthly Totals'),
+    ], string='Summary', required=True, readonly=True)
+
+    _purchase_summary_uniq = models.Constraint(
+        'UNIQUE(purchase_id, summary)',
+        'A purchase can be queued only once per summary.',
+    )
+
+    @api.model
+    def _enqueue(self, purchases):
+        """Queue new purchases for every summary. The summaries take the rows
+        of committed transactions only, whatever their ids and however long
+        the transactions that created them ran."""
+        self.env.cr.execute(SQL("""
+            INSERT INTO csr_activity_purchase_queue (purchase_id, summary)
+            SELECT purchase_id, summary
+              FROM UNNEST(%s) AS purchase_id
+        CROSS JOIN UNNEST(%s::varchar[]) AS summary
+        """, purchases.ids, [summary for summary, _label in self._fields['summary'].selection]))
+
+    @api.model
+    def _dequeue(self, summary):
+        """Return the query taking the purchases queued for ``summary`` out
+        of the queue, as a ``purchase_id`` column for a ``WITH`` clause"""
+        return SQL(
+            "DELETE FROM csr_activity_purchase_queue WHERE summary = %s RETURNING purchase_id",
+            summary,
+        )
+
+    @api.model
+    def _filter_summarized(self, purchases, summary):
+        """Return the purchases already included in ``summary``"""
+        if not purchases:
+            return purchases
+        self.env.cr.execute(SQL("""
+            SELECT purchase_id
+              FROM csr_activity_purchase_queue
+             WHERE purchase_id IN %s AND summary = %s
+        """, tuple(purchases.ids), summary))
+        queued = {purchase_id for purchase_id, in self.env.cr.fetchall()}
+        return purchases.filtered(lambda purchase: purchase.id not in queued)
+
+
+class CSRActivityPurchaseMonthly(models.Model):
+    _name = 'csr.activity.purchase.monthly'
+    _description = 'CSR Activity Purchases per Month'
+    _order = 'month desc, employee_id, activity_id'
+    _log_access = False
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, ondelete='cascade', index=True)
+    activity_id = fields.Many2one('csr.activity', string='Activity', required=True, readonly=True, ondelete='cascade', index=True)
+    ngo_id = fields.Many2one('csr.ngo', string='NGO', required=True, readonly=True, ondelete='cascade', index=True)
+    month = fields.Date(string='Month', required=True, readonly=True, index=True)
+    purchase_count = fields.Integer(string='Purchases', readonly=True, aggregator='sum')
+    xp_paid = fields.Float(string='XP Paid', readonly=True, aggregator='sum')
+    o2_received = fields.Float(string='O2 Received', readonly=True, aggregator='sum')
+
+    _employee_activity_ngo_month_uniq = models.Constraint(
+        'UNIQUE(employee_id, activity_id, ngo_id, month)',
+        'There can be only one monthly total per employee, activity and NGO.',
+    )
+
+    @api.model
+    def _rollup_purchases(self):
+        """Add the purchases queued since the last run to the monthly totals"""
+        self.env['csr.activity.purchase'].flush_model()
+        self.env.cr.execute(SQL("""
+            WITH queued AS (%(queued)s)
+            INSERT INTO csr_activity_purchase_monthly AS monthly
+                   (employee_id, activity_id, ngo_id, month, purchase_count, xp_paid, o2_received)
+            SELECT purchase.employee_id, purchase.activity_id, purchase.ngo_id,
+                   DATE_TRUNC('month', purchase.purchase_date)::date,
+                   COUNT(*), SUM(purchase.xp_paid), SUM(purchase.o2_received)
+              FROM csr_activity_purchase purchase
+              JOIN queued ON queued.purchase_id = purchase.id
+          GROUP BY purchase.employee_id, purchase.activity_id, purchase.ngo_id,
+                   DATE_TRUNC('month', purchase.purchase_date)::date
+                ON CONFLICT (employee_id, activity_id, ngo_id, month) DO UPDATE
+               SET purchase_count = monthly.purchase_count + EXCLUDED.purchase_count,
+                   xp_paid = monthly.xp_paid + EXCLUDED.xp_paid,
+                   o2_received = monthly.o2_received + EXCLUDED.o2_received
+        """, queued=self.env['csr.activity.purchase.queue']._dequeue('monthly')))
+        self.invalidate_model()
+
+    @api.model
+    def _subtract_purchases(self, purchases):
+        """Remove deleted purchases from the totals they were added to"""
+        purchases = self.env['csr.activity.purchase.queue']._filter_summarized(purchases, 'monthly')
+        if not purchases:
+            return
+        purchases.flush_recordset()
+        self.env.cr.execute(SQL("""
+            UPDATE csr_activity_purchase_monthly monthly
+               SET purchase_count = monthly.purchase_count - purchase.count,
+                   xp_paid = monthly.xp_paid - purchase.xp_paid,
+                   o2_received = monthly.o2_received - purchase.o2_received
+              FROM (
+                    SELECT employee_id, activity_id, ngo_id, DATE_TRUNC('month', purchase_date)::date AS month,
+                           COUNT(*), SUM(xp_paid) AS xp_paid, SUM(o2_received) AS o2_received
+                      FROM csr_activity_purchase
+                     WHERE id IN %s
+                  GROUP BY employee_id, activity_id, ngo_id, DATE_TRUNC('month', purchase_date)::date
+                   ) purchase
+             WHERE monthly.employee_id = purchase.employee_id
+               AND monthly.activity_id = purchase.activity_id
+               AND monthly.ngo_id = purchase.ngo_id
+               AND monthly.month = purchase.month
+        """, tuple(purchases.ids)))
+        self.invalidate_model()
+
+    @api.model
+    def _cron_rollup_purchases(self, batch_size=10000, max_batches=50):
+        """Refresh the monthly totals, then archive the old purchases"""
+        self._rollup_purchases()
+        self.env['csr.activity.purchase.archive']._archive_purchases(batch_size, max_batches)
+
+
+class CSRActivityPurchaseArchive(models.Model):
+    _name = 'csr.activity.purchase.archive'
+    _description = 'Archived CSR Activity Purchase'
+    _order = 'purchase_date desc'
+    _log_access = False
+
+    purchase_id = fields.Integer(string='Original Purchase', readonly=True, index=True)
+    activity_id = fields.Many2one('csr.activity', string='Activity', readonly=True, ondelete='cascade', index=True)
+    employee_id = fields.Many2one('hr.employee', string='Employee', readonly=True, ondelete='cascade', index=True)
+    ngo_id = fields.Many2one('csr.ngo', string='NGO', readonly=True, ondelete='cascade', index=True)
+    purchase_date = fields.Datetime(string='Purchase Date', readonly=True)
+    xp_paid = fields.Float(string='XP Paid', readonly=True)
+    o2_received = fields.Float(string='O2 Received', readonly=True)
+
+    @api.model
+    def _archive_purchases(self, batch_size=10000, max_batches=50):
+        """Move the purchases older than the configured number of months to
+        the archive, by batches. Only the purchases included in all the
+        summaries, i.e. no longer queued, can leave the hot table. The cron is
+        triggered again if some are left."""
+        months = int(self.env['ir.config_parameter'].sudo().get_param('csr_sustainability.purchase_archive_months', 12))
+        if months <= 0:
+            return
+        self.env['csr.activity.purchase'].flush_model()
+        for _batch in range(max_batches):
+            self.env.cr.execute(SQL("""
+                WITH moved AS (
+                    DELETE FROM csr_activity_purchase
+                     WHERE id IN (
+                            SELECT id
+                              FROM csr_activity_purchase
+                             WHERE purchase_date < NOW() AT TIME ZONE 'UTC' - %(months)s * INTERVAL '1 month'
+                               AND NOT EXISTS (SELECT 1 FROM csr_activity_purchase_queue queue
+                                                WHERE queue.purchase_id = csr_activity_purchase.id)
+                          ORDER BY id
+                             LIMIT %(batch_size)s
+                     )
+                 RETURNING id, activity_id, employee_id, ngo_id, purchase_date, xp_paid, o2_received
+                )
+                INSERT INTO csr_activity_purchase_archive
+                       (purchase_id, activity_id, employee_id, ngo_id, purchase_date, xp_paid, o2_received)
+                SELECT id, activity_id, employee_id, ngo_id, purchase_date, xp_paid, o2_received
+                  FROM moved
+            """, months=months, batch_size=batch_size))
+            if self.env.cr.rowcount < batch_size:
+                break
+        else:
+            self.env.ref('csr_sustainability.ir_cron_purchase_rollup')._trigger()
+        self.env['csr.activity.purchase'].invalidate_model()
+        self.env['hr.employee'].invalidate_model(['activity_purchase_ids'])
+        self.env['csr.activity'].invalidate_model(['purchase_ids'])
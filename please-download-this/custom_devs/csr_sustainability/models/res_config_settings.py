@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from odoo import _, fields, models
+from odoo.exceptions import ValidationError
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    csr_badge_silver_threshold = fields.Float(
+        string='Silver Badge',
+        config_parameter='csr_sustainability.badge_silver_threshold',
+        default=50.0,
+        help='O2 an employee needs to earn the silver badge')
+    csr_badge_gold_threshold = fields.Float(
+        string='Gold Badge',
+        config_parameter='csr_sustainability.badge_gold_threshold',
+        default=100.0,
+        help='O2 an employee needs to earn the gold badge')
+    csr_portal_profiling = fields.Boolean(
+        string='Profile Portal Routes',
+        config_parameter='csr_sustainability.portal_profiling',
+        help='Record the SQL, compute and render time of every sustainability portal request')
+    csr_portal_server_timing = fields.Boolean(
+        string='Server-Timing Headers',
+        config_parameter='csr_sustainability.portal_server_timing',
+        help='Send the measured timings to the browser as Server-Timing headers')
+    csr_award_mode = fields.Selection([
+        ('sync', 'Immediately'),
+        ('queued', 'Queued'),
+    ], string='Project Completion Awards',
+        config_parameter='csr_sustainability.award_mode',
+        default='sync',
+        help='Queued: completions are recorded by a background job that credits the XP of many employees at once, '
+             'so that busy events do not make the requests wait on each other')
+    csr_purchase_archive_months = fields.Integer(
+        string='Archive Purchases After',
+        config_parameter='csr_sustainability.purchase_archive_months',
+        default=12,
+        help='Number of months after which activity purchases are moved to the archive (0 to keep them all)')
+
+    def set_values(self):
+        if self.csr_badge_silver_threshold > self.csr_badge_gold_threshold:
+            raise ValidationError(_('The silver badge threshold cannot be higher than the gold one.'))
+        if self.csr_purchase_archive_months < 0:
+            raise ValidationError(_('The purchase archive delay cannot be negative.'))
+        Employee = self.env['hr.employee'].sudo()
+        thresholds = Employee._get_badge_thresholds()
+        super().set_values()
+        if Employee._get_badge_thresholds() != thresholds:
+            Employee._reclassify_badges()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from odoo import models, tools
+
+from .cache import values_changed
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    def write(self, vals):
+        renamed = values_changed(self, vals, ('name',))
+        res = super().write(vals)
+        if renamed:
+            # the employee name fallback of _get_csr_identity_ids depends on it
+            self.env.registry.clear_cache()
+        return res
+
+    @tools.ormcache('self.id', 'match_name')
+    def _get_csr_identity_ids(self, match_name=False):
+        """Return the ``(ngo_id, employee_id)`` linked to this user.
+
+        The result is cached per user, until the ``user_id`` of an NGO or
+        the ``user_id`` or name of an employee changes. With ``match_name``,
+        an employee whose name matches the user's is used when no employee
+        is linked to the user (the employee name is trigram-indexed).
+        """
+        self.ensure_one()
+        ngo = self.env['csr.ngo'].sudo().search([('user_id', '=', self.id)], limit=1)
+        employee = self.env['hr.employee'].sudo().search([('user_id', '=', self.id)], limit=1)
+        if not employee and match_name:
+            employee = self.env['hr.employee'].sudo().search([('name', 'ilike', self.name)], limit=1)
+        return ngo.id, employee.id
+
+    def _get_csr_identity(self, match_name=False):
+        """Return the ``(ngo, employee)`` records (sudo) linked to this user"""
+        ngo_id, employee_id = self._get_csr_identity_ids(match_name)
+        return self.env['csr.ngo'].sudo().browse(ngo_id), self.env['hr.employee'].sudo().browse(employee_id)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import column_exists, drop_view_if_exists, rename_column
+
+
+class CSRRouteSample(models.Model):
+    _name = 'csr.route.sample'
+    _description = 'Portal Route Timing Sample'
+    _order = 'id desc'
+    _log_access = False
+
+    route = fields.Char(string='Route', required=True, index=True)
+    date = fields.Datetime(string='Date', required=True, index=True)
+    sql_count = fields.Integer(string='Queries')
+    sql_time = fields.Float(string='SQL (ms)')
+    python_time = fields.Float(string='Python (ms)', help='Time spent in the controller outside SQL')
+    render_time = fields.Float(string='Render (ms)')
+    total_time = fields.Float(string='Total (ms)')
+
+    def _auto_init(self):
+        # keep the samples of the databases where the column was compute_time
+        cr = self.env.cr
+        if column_exists(cr, self._table, 'compute_time') and not column_exists(cr, self._table, 'python_time'):
+            rename_column(cr, self._table, 'compute_time', 'python_time')
+        return super()._auto_init()
+
+    @api.model
+    def _record(self, samples):
+        """Store the samples measured by ``controllers.profiling.profiled``,
+        with one query; their ``date`` is a Unix timestamp"""
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO csr_route_sample (route, date, sql_count, sql_time, python_time, render_time, total_time)
+            VALUES %s
+            """,
+            SQL(', ').join(
+                SQL(
+                    "(%s, TO_TIMESTAMP(%s) AT TIME ZONE 'UTC', %s, %s, %s, %s, %s)",
+                    sample['route'], sample['date'], sample['sql_count'], sample['sql_time'], sample['python_time'],
+                    sample['render_time'], sample['total_time'],
+                )
+                for sample in samples
+            ),
+        ))
+
+    @api.autovacuum
+    def _gc_samples(self):
+        self.env.cr.execute(SQL(
+            "DELETE FROM csr_route_sample WHERE date < NOW() AT TIME ZONE 'UTC' - INTERVAL '7 days'"
+        ))
+
+
+class CSRRouteStats(models.Model):
+    _name = 'csr.route.stats'
+    _description = 'Portal Route Timings'
+    _auto = False
+    _order = 'p95_time desc'
+
+    route = fields.Char(string='Route', readonly=True)
+    sample_count = fields.Integer(string='Requests', readonly=True)
+    p50_time = fields.Float(string='p50 (ms)', readonly=True)
+    p95_time = fields.Float(string='p95 (ms)', readonly=True)
+    p50_sql_count = fields.Float(string='p50 Queries', readonly=True)
+    p95_sql_count = fields.Float(string='p95 Queries', readonly=True)
+    p95_sql_time = fields.Float(string='p95 SQL (ms)', readonly=True)
+    p95_python_time = fields.Float(string='p95 Python (ms)', readonly=True)
+    p95_render_time = fields.Float(string='p95 Render (ms)', readonly=True)
+
+    def init(self):
+        # percentiles over the samples of the last 24 hours
+        drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL("""
+            CREATE OR REPLACE VIEW %s AS (
+                SELECT MIN(id) AS id,
+                       route,
+                       COUNT(*) AS sample_count,
+                       PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY total_time) AS p50_time,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY total_time) AS p95_time,
+                       PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY sql_count) AS p50_sql_count,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY sql_count) AS p95_sql_count,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY sql_time) AS p95_sql_time,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY python_time) AS p95_python_time,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY render_time) AS p95_render_time
+                  FROM csr_route_sample
+                 WHERE date > NOW() AT TIME ZONE 'UTC' - INTERVAL '1 day'
+              GROUP BY route
+            )
+        """, SQL.identifier(self._table)))
@@ -0,0 +1,10 @@
+from . import test_api
+from . import test_benchmark
+from . import test_history_export
+from . import test_leaderboard
+from . import test_ledger
+from . import test_ngo_import
+from . import test_portal
+from . import test_project
+from . import test_purchase_history
+from . import test_res_users
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from odoo import Command, fields
+from odoo.modules.module import get_manifest
+from odoo.tests import HttpCase, TransactionCase, new_test_user
+from odoo.tools import SQL, config
+
+_logger = logging.getLogger(__name__)
+
+
+class CSRCommon(TransactionCase):
+    """Small dataset for the functional tests: two NGOs, two activities and
+    a project of the first one, three employees (the first one with a user,
+    the first two in the project), an HR officer and a user who is neither
+    an NGO nor an employee."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True))
+        cls.user_ngo = new_test_user(cls.env, login='csr_ngo', groups='csr_sustainability.group_ngo_portal')
+        cls.user_other_ngo = new_test_user(cls.env, login='csr_other_ngo', groups='csr_sustainability.group_ngo_portal')
+        cls.user_employee = new_test_user(cls.env, login='csr_employee', groups='base.group_user')
+        cls.user_hr = new_test_user(cls.env, login='csr_hr', groups='base.group_user,hr.group_hr_user')
+        cls.user_nobody = new_test_user(cls.env, login='csr_nobody', groups='base.group_user')
+
+        cls.ngo, cls.other_ngo = cls.env['csr.ngo'].create([
+            {'name': 'CSR Test NGO', 'user_id': cls.user_ngo.id},
+            {'name': 'CSR Other NGO', 'user_id': cls.user_other_ngo.id},
+        ])
+        cls.employee, cls.employee_2, cls.employee_3 = cls.env['hr.employee'].create([
+            {'name': 'CSR Employee', 'user_id': cls.user_employee.id},
+            {'name': 'CSR Employee 2'},
+            {'name': 'CSR Employee 3'},
+        ])
+        cls.activity, cls.activity_expensive = cls.env['csr.activity'].create([
+            {'name': 'Plant a Tree', 'xp': 10, 'value': 5, 'ngo_id': cls.ngo.id},
+            {'name': 'Clean a Beach', 'xp': 1000, 'value': 600, 'ngo_id': cls.ngo.id},
+        ])
+        cls.project = cls.env['project.project'].create({
+            'name': 'CSR Test Project',
+            'is_sustainability': True,
+            'ngo_id': cls.ngo.id,
+            'xp': 30,
+            'employee_ids': [Command.link(cls.employee.id), Command.link(cls.employee_2.id)],
+        })
+
+    @classmethod
+    def _give(cls, employee, xp=0, o2=0.0):
+        """Credit ``employee`` through an adjustment of the ledger"""
+        return cls.env['csr.points.ledger'].create({'employee_id': employee.id, 'xp_delta': xp, 'o2_delta': o2})
+
+
+class CSRHttpCommon(HttpCase, CSRCommon):
+    """The functional dataset, for the tests of the routes"""
+
+    def _call(self, route, **params):
+        """Return the JSON-RPC response of ``route``, error included"""
+        response = self.url_open(route, data=json.dumps({'jsonrpc': '2.0', 'method': 'call', 'id': 1, 'params': params}),
+                                 headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.status_code, 200)
+        # the route wrote through a cursor of its own
+        self.env.invalidate_all()
+        return response.json()
+
+
+class CSRBenchmarkCommon(HttpCase):
+    """Seeded synthetic dataset and timing helpers for the benchmark suite.
+
+    The sizes below are the reference volumes; set ``CSR_BENCHMARK_SCALE``
+    (e.g. ``0.01``) to run on a smaller dataset. Results are written as JSON
+    to ``CSR_BENCHMARK_OUTPUT`` (defaults to ``csr_benchmark.json`` in the
+    data directory) so that releases can be compared.
+    """
+
+    SEED = 42
+    SIZES = {
+        'employees': 20000,
+        'ngos': 500,
+        'activities': 10000,
+        'projects': 5000,
+        'purchases': 1000000,
+    }
+    PROJECTS_PER_EMPLOYEE = 3
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        scale = float(os.environ.get('CSR_BENCHMARK_SCALE', 1))
+        cls.sizes = {name: max(1, int(size * scale)) for name, size in cls.SIZES.items()}
+        cls.results = {}
+        cls.rng = random.Random(cls.SEED)
+
+        start = time.perf_counter()
+        cls._generate_users()
+        cls._generate_employees()
+        cls._generate_ngos()
+        cls._generate_activities()
+        cls._generate_projects()
+        cls._generate_purchases()
+        cls.env.invalidate_all()
+        _logger.info("CSR benchmark dataset %s generated in %.1fs", cls.sizes, time.perf_counter() - start)
+
+    @classmethod
+    def tearDownClass(cls):
+        output = os.environ.get('CSR_BENCHMARK_OUTPUT') or os.path.join(config['data_dir'], 'csr_benchmark.json')
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': get_manifest('csr_sustainability')['version'],
+                'date': fields.Datetime.to_string(fields.Datetime.now()),
+                'sizes': cls.sizes,
+                'results': cls.results,
+            }, f, indent=2, sort_keys=True)
+        _logger.info("CSR benchmark results written to %s", output)
+        super().tearDownClass()
+
+    # ------------------------------------------------------------
+    # Data generation
+    # ------------------------------------------------------------
+
+    @classmethod
+    def _generate_users(cls):
+        cls.user_employee = new_test_user(cls.env, login='csr_bench_employee', groups='base.group_user')
+        cls.user_ngo = new_test_user(cls.env, login='csr_bench_ngo', groups='csr_sustainability.group_ngo_portal')
+        cls.user_other_ngos = new_test_user(cls.env, login='csr_bench_other_ngos', groups='csr_sustainability.group_ngo_portal')
+
+    @classmethod
+    def _generate_employees(cls):
+        Employee = cls.env['hr.employee'].with_context(tracking_disable=True, mail_create_nolog=True)
+        cls.employees = Employee.create([
+            {'name': f'Bench Employee {index}'} for index in range(cls.sizes['employees'])
+        ])
+        cls.employee = cls.employees[0]
+        cls.employee.user_id = cls.user_employee
+
+    @classmethod
+    def _generate_ngos(cls):
+        cls.ngos = cls.env['csr.ngo'].create([{
+            'name': f'Bench NGO {index}',
+            'user_id': (cls.user_ngo if not index else cls.user_other_ngos).id,
+        } for index in range(cls.sizes['ngos'])])
+        cls.ngo = cls.ngos[0]
+
+    @classmethod
+    def _generate_activities(cls):
+        cls.env.cr.execute(SQL("""
+            INSERT INTO csr_activity (name, description, ngo_id, xp, value, o2_per_xp, active, purchase_count,
+                                      create_uid, create_date, write_uid, write_date)
+            SELECT 'Bench Activity ' || n, 'Synthetic activity number ' || n,
+                   (%(ngo_ids)s::int[])[1 + n %% %(ngo_count)s],
+                   1 + n %% 50, (n %% 20) / 2.0, (n %% 20) / 2.0 / (1 + n %% 50), n %% 10 != 0, 0,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM generate_series(1, %(count)s) n
+         RETURNING id
+        """, ngo_ids=cls.ngos.ids, ngo_count=len(cls.ngos), uid=cls.env.uid, count=cls.sizes['activities']))
+        cls.activities = cls.env['csr.activity'].browse([row[0] for row in cls.env.cr.fetchall()])
+        cls.env.add_to_compute(cls.env['csr.ngo']._fields['activity_count'], cls.ngos)
+        cls.ngos.flush_recordset()
+
+    @classmethod
+    def _generate_projects(cls):
+        Project = cls.env['project.project'].with_context(tracking_disable=True, mail_create_nolog=True)
+        cls.projects = Project.create([{
+            'name': f'Bench Project {index}',
+            'is_sustainability': True,
+            'ngo_id': cls.ngos[index % len(cls.ngos)].id,
+            'xp': 10 + index % 40,
+        } for index in range(cls.sizes['projects'])])
+
+        # every employee joins a few random projects and completes one of them
+        members, completions = [], []
+        for employee_id in cls.employees.ids:
+            project_ids = cls.rng.sample(cls.projects.ids, min(cls.PROJECTS_PER_EMPLOYEE, len(cls.projects)))
+            members += [(project_id, employee_id) for project_id in project_ids]
+            completions.append((project_ids[0], employee_id))
+        # make sure the benchmarked employee has a project left to complete
+        employee_project_ids = {project_id for project_id, employee_id in members if employee_id == cls.employee.id}
+        cls.project_pending = cls.projects.filtered(lambda project: project.id not in employee_project_ids)[:1]
+        members.append((cls.project_pending.id, cls.employee.id))
+        for relation, (project_column, employee_column), rows in (
+            ('hr_employee_project_project_rel', ('project_project_id', 'hr_employee_id'), members),
+            ('project_employee_completion_rel', ('project_id', 'employee_id'), completions),
+        ):
+            cls.env.cr.execute(SQL(
+                "INSERT INTO %s (%s, %s) SELECT * FROM unnest(%s::int[], %s::int[]) ON CONFLICT DO NOTHING",
+                SQL.identifier(relation), SQL.identifier(project_column), SQL.identifier(employee_column),
+                [project_id for project_id, _employee_id in rows], [employee_id for _project_id, employee_id in rows],
+            ))
+        cls.projects.invalidate_recordset(['employee_ids', 'completed_by_employee_ids'])
+        cls.projects._recount_participation()
+        cls.projects.flush_recordset()
+
+    @classmethod
+    def _generate_purchases(cls):
+        cls.env.cr.execute(SQL("SELECT COALESCE(MAX(id), 0) FROM csr_activity_purchase"))
+        last_id = cls.env.cr.fetchone()[0]
+        cls.env.cr.execute(SQL("""
+            INSERT INTO csr_activity_purchase (activity_id, employee_id, ngo_id, purchase_date, xp_paid, o2_received,
+                                               create_uid, create_date, write_uid, write_date)
+            SELECT activity.id, (%(employee_ids)s::int[])[1 + (n * 104729) %% %(employee_count)s], activity.ngo_id,
+                   NOW() AT TIME ZONE 'UTC' - (n %% 730) * INTERVAL '1 day', activity.xp, activity.value,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM generate_series(1, %(count)s) n
+              JOIN csr_activity activity ON activity.id = (%(activity_ids)s::int[])[1 + (n * 7919) %% %(activity_count)s]
+        """, employee_ids=cls.employees.ids, employee_count=len(cls.employees),
+             activity_ids=cls.activities.ids, activity_count=len(cls.activities),
+             uid=cls.env.uid, count=cls.sizes['purchases']))
+        # the rows above bypass the ORM: bring the counters and balances up to date
+        cls.env.cr.execute(SQL("""
+            UPDATE csr_activity activity
+               SET purchase_count = purchase.count
+              FROM (SELECT activity_id, COUNT(*) FROM csr_activity_purchase GROUP BY activity_id) purchase
+             WHERE activity.id = purchase.activity_id
+        """))
+        cls.env.cr.execute(SQL("""
+            UPDATE hr_employee employee
+               SET activity_purchase_count = purchase.count,
+                   "money_O2" = purchase.o2,
+                   sustainability_points = 1000
+              FROM (SELECT employee_id, COUNT(*), SUM(o2_received) AS o2 FROM csr_activity_purchase GROUP BY employee_id) purchase
+             WHERE employee.id = purchase.employee_id
+        """))
+        cls.env['csr.leaderboard.period']._add_purchases(SQL(
+            "SELECT employee_id, purchase_date, o2_received FROM csr_activity_purchase WHERE id > %s", last_id,
+        ))
+        cls.env.invalidate_all()
+        cls.env['hr.employee']._refresh_leaderboard_rank()
+        cls.env['hr.employee']._reclassify_badges()
+
+    # ------------------------------------------------------------
+    # Measures
+    # ------------------------------------------------------------
+
+    @contextmanager
+    def benchmark(self, name, query_budget):
+        """Time the enclosed block, check it stays within ``query_budget``
+        queries and record both in the results file."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        start = time.perf_counter()
+        with self.assertQueryCount(query_budget):
+            yield
+        duration = time.perf_counter() - start
+        self.results[name] = {
+            'duration': round(duration, 4),
+            'queries': self.cr.sql_log_count - queries,
+            'query_budget': query_budget,
+        }
+        _logger.info("CSR benchmark %s: %.4fs, %d queries", name, duration, self.results[name]['queries'])
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import CSRHttpCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRApi(CSRHttpCommon):
+
+    def test_api_identity(self):
+        self.authenticate('csr_nobody', 'csr_nobody')
+        self.assertIn('error', self._call('/csr/api/v1/projects'))
+
+    def test_api_employee(self):
+        self._give(self.employee, xp=15)
+        self.authenticate('csr_employee', 'csr_employee')
+        projects = self._call('/csr/api/v1/projects')['result']
+        self.assertEqual([record['id'] for record in projects['records']], self.project.ids)
+        self.assertIn('error', self._call('/csr/api/v1/projects', fields=['name', 'privacy_visibility']))
+
+        results = self._call('/csr/api/v1/activities/purchase', activity_ids=[self.activity.id, self.activity_expensive.id])['result']
+        self.assertEqual([result['success'] for result in results], [True, False])
+        balance = self._call('/csr/api/v1/balance')['result']
+        self.assertEqual(balance['sustainability_points'], 5)
+
+        purchases = self._call('/csr/api/v1/purchases', fields=['activity_id', 'xp_paid'])['result']
+        self.assertEqual(purchases['count'], 1)
+
+        # employees complete projects for themselves only
+        result = self._call(f'/csr/api/v1/projects/{self.project.id}/complete', employee_ids=[self.employee_2.id])['result']
+        self.assertEqual(result['employee_ids'], self.employee.ids)
+
+    def test_api_ngo(self):
+        self.authenticate('csr_other_ngo', 'csr_other_ngo')
+        self.assertFalse(self._call('/csr/api/v1/projects')['result']['records'])
+        self.assertFalse(self._call('/csr/api/v1/activities')['result']['records'])
+        self.assertIn('error', self._call('/csr/api/v1/balance'))
+        self.assertIn('error', self._call(f'/csr/api/v1/projects/{self.project.id}/complete', employee_ids=self.employee.ids))
+        self.assertFalse(self.project.completed_by_employee_ids)
+
+        self.authenticate('csr_ngo', 'csr_ngo')
+        activities = self._call('/csr/api/v1/activities', fields=['name'])['result']
+        self.assertEqual(activities['count'], 2)
+        result = self._call(f'/csr/api/v1/projects/{self.project.id}/complete', employee_ids=self.employee.ids)['result']
+        self.assertEqual(result['employee_ids'], self.employee.ids)
+
+    def test_api_input_validation(self):
+        self.authenticate('csr_employee', 'csr_employee')
+        for params in ({'ids': 'abc'}, {'ids': [1, 'abc']}, {'ids': [True]}, {'limit': 'abc'}, {'offset': 1.5}, {'fields': 'name'}):
+            self.assertIn('error', self._call('/csr/api/v1/activities', **params), params)
+        for activity_ids in ('abc', [self.activity.id, 'abc'], [-1]):
+            self.assertIn('error', self._call('/csr/api/v1/activities/purchase', activity_ids=activity_ids), activity_ids)
+        self.assertFalse(self.employee.activity_purchase_ids)
+
+        self.authenticate('csr_ngo', 'csr_ngo')
+        result = self._call(f'/csr/api/v1/projects/{self.project.id}/complete', employee_ids=[self.employee.id, None])
+        self.assertIn('error', result)
+        self.assertFalse(self.project.completed_by_employee_ids)
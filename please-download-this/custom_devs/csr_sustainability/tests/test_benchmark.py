@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import CSRBenchmarkCommon
+
+# Maximum number of queries of each benchmarked path. Set them from the
+# ``queries`` measured by a reference run (see the results file), with a
+# small margin, and lower them when a change makes a path cheaper, so that
+# regressions are caught.
+QUERY_BUDGETS = {
+    'leaderboard_rank': 10,
+    'leaderboard_page': 5,
+    'leaderboard_period': 5,
+    'portal_my_projects_employee': 60,
+    'portal_my_projects_ngo': 60,
+    'portal_my_activities_employee': 60,
+    'portal_my_activities_search': 60,
+    'portal_my_activities_affordable': 60,
+    'portal_home_counters': 20,
+    'portal_project_page': 40,
+    'api_activities_ids': 20,
+    'action_purchase': 40,
+    'action_mark_done': 40,
+}
+
+
+@tagged('post_install', '-at_install', '-standard', 'csr_benchmark')
+class TestCSRBenchmark(CSRBenchmarkCommon):
+    """Run with ``--test-tags csr_benchmark``"""
+
+    def test_leaderboard_rank(self):
+        """Refresh of the stored ranks after an O2 change"""
+        with self.benchmark('leaderboard_rank', QUERY_BUDGETS['leaderboard_rank']):
+            self.env['csr.points.ledger'].create({
+                'employee_id': self.employees[-1].id,
+                'o2_delta': 500.0,
+            })
+        self.assertEqual(self.employees[-1].leaderboard_rank, 1)
+
+    def test_leaderboard_page(self):
+        """First page of the leaderboard list view"""
+        with self.benchmark('leaderboard_page', QUERY_BUDGETS['leaderboard_page']):
+            self.env['hr.employee'].search_fetch(
+                [('leaderboard_rank', '<=', 80)],
+                ['name', 'leaderboard_rank', 'money_O2', 'badge', 'activity_purchase_count'],
+                order='money_O2 desc, id', limit=80,
+            )
+
+    def test_leaderboard_period(self):
+        """Top of the month and department ranking, read from the period totals"""
+        Totals = self.env['csr.leaderboard.period']
+        with self.benchmark('leaderboard_period', QUERY_BUDGETS['leaderboard_period']):
+            Totals._get_top('month', 10)
+            Totals._get_department_ranking('month')
+
+    def test_portal_my_projects_employee(self):
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_my_projects_employee', QUERY_BUDGETS['portal_my_projects_employee']):
+            response = self.url_open('/my/projects')
+        self.assertEqual(response.status_code, 200)
+
+    def test_portal_my_projects_ngo(self):
+        self.authenticate('csr_bench_ngo', 'csr_bench_ngo')
+        with self.benchmark('portal_my_projects_ngo', QUERY_BUDGETS['portal_my_projects_ngo']):
+            response = self.url_open('/my/projects')
+        self.assertEqual(response.status_code, 200)
+
+    def test_portal_my_activities_employee(self):
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_my_activities_employee', QUERY_BUDGETS['portal_my_activities_employee']):
+            response = self.url_open('/my/activities')
+        self.assertEqual(response.status_code, 200)
+
+    def test_portal_my_activities_search(self):
+        """Catalogue search, served by the trigram indexes"""
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_my_activities_search', QUERY_BUDGETS['portal_my_activities_search']):
+            response = self.url_open('/my/activities?search=Activity 4242')
+        self.assertEqual(response.status_code, 200)
+
+    def test_portal_my_activities_affordable(self):
+        """Affordable activities sorted by O2 per XP, filtered and sorted in SQL"""
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_my_activities_affordable', QUERY_BUDGETS['portal_my_activities_affordable']):
+            response = self.url_open('/my/activities?filterby=affordable&sortby=o2_per_xp&value_min=2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_portal_home_counters(self):
+        """Asynchronous counters of the portal home"""
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_home_counters', QUERY_BUDGETS['portal_home_counters']):
+            response = self.make_jsonrpc_request('/my/counters', {
+                'counters': ['activity_count', 'csr_project_count', 'csr_completed_project_count',
+                             'csr_purchase_count', 'csr_xp_balance'],
+            })
+        self.assertEqual(response['csr_xp_balance'], self.employee.sustainability_points)
+
+    def test_portal_project_page(self):
+        """Project page with a long task list, only one page of it is read"""
+        self.env['project.task'].with_context(tracking_disable=True, mail_create_nolog=True).create([{
+            'name': f'Bench Task {index}',
+            'project_id': self.project_pending.id,
+        } for index in range(500)])
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('portal_project_page', QUERY_BUDGETS['portal_project_page']):
+            response = self.url_open(f'/my/projects/{self.project_pending.id}/tasks/page/3')
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_activities_ids(self):
+        """Batched read of selected activities through the JSON API"""
+        activities = self.activities.filtered('active')[:50]
+        self.authenticate('csr_bench_employee', 'csr_bench_employee')
+        with self.benchmark('api_activities_ids', QUERY_BUDGETS['api_activities_ids']):
+            response = self.make_jsonrpc_request('/csr/api/v1/activities', {
+                'ids': activities.ids,
+                'fields': ['name', 'xp', 'ngo_id'],
+            })
+        self.assertEqual(response['count'], len(activities))
+
+    def test_action_purchase(self):
+        activity = self.activities.filtered('active')[0]
+        Wizard = self.env['csr.purchase.activity.wizard'].with_user(self.user_employee).with_context(
+            active_id=activity.id, active_model='csr.activity')
+        with self.benchmark('action_purchase', QUERY_BUDGETS['action_purchase']):
+            Wizard.create({}).action_purchase()
+        self.assertEqual(self.employee.activity_purchase_count, len(self.employee.activity_purchase_ids))
+
+    def test_action_mark_done(self):
+        project = self.project_pending.with_user(self.user_employee)
+        with self.benchmark('action_mark_done', QUERY_BUDGETS['action_mark_done']):
+            project.action_mark_done()
+        self.assertIn(self.employee, self.project_pending.completed_by_employee_ids)
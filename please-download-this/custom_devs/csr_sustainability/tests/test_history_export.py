@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import Command, fields
+from odoo.tests import tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRHistoryExport(CSRCommon):
+
+    def _export(self, kind, **filters):
+        self.env.cr.execute(self.env['csr.history.export']._get_export_query(kind, **filters))
+        return self.env.cr.fetchall()
+
+    def test_export_purchases(self):
+        self._give(self.employee, xp=100)
+        other_activity = self.env['csr.activity'].create({'name': 'Other', 'xp': 1, 'value': 1, 'ngo_id': self.other_ngo.id})
+        self.env['csr.activity.purchase']._purchase_batch([
+            (self.employee.id, self.activity.id),
+            (self.employee.id, other_activity.id),
+        ])
+        today = fields.Date.today()
+        rows = self._export('purchases', ngo_ids=[self.ngo.id], date_from=today, date_to=today)
+        self.assertEqual([row[1:] for row in rows], [('CSR Employee', 'Plant a Tree', 'CSR Test NGO', 10, 5, False)])
+        self.assertFalse(self._export('purchases', ngo_ids=[self.ngo.id], date_to=today - timedelta(days=1)))
+        self.assertFalse(self._export('purchases', ngo_ids=[]))
+
+    def test_export_completions(self):
+        zero_xp_project = self.env['project.project'].create({
+            'name': 'No XP',
+            'is_sustainability': True,
+            'ngo_id': self.ngo.id,
+            'employee_ids': [Command.link(self.employee.id)],
+        })
+        self.project._complete_for_employees(self.employee)
+        zero_xp_project._complete_for_employees(self.employee)
+        today = fields.Date.today()
+        # completions without XP have a date too
+        rows = self._export('completions', ngo_ids=[self.ngo.id], date_from=today, date_to=today)
+        self.assertEqual(
+            sorted(row[1:] for row in rows),
+            [('CSR Employee', 'CSR Test Project', 'CSR Test NGO', 30), ('CSR Employee', 'No XP', 'CSR Test NGO', 0)],
+        )
+        self.assertFalse(self._export('completions', ngo_ids=[self.ngo.id], date_from=today + timedelta(days=1)))
+        self.assertFalse(self._export('completions', ngo_ids=[self.other_ngo.id]))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRLeaderboard(CSRCommon):
+
+    def _get_ranks(self):
+        return (self.employee + self.employee_2 + self.employee_3).mapped('leaderboard_rank')
+
+    def test_leaderboard_rank(self):
+        self._give(self.employee, o2=3e6)
+        self._give(self.employee_2, o2=2e6)
+        self._give(self.employee_3, o2=1e6)
+        self.assertEqual(self._get_ranks(), [1, 2, 3])
+        # the employees overtaken move down in the same transaction
+        self._give(self.employee_3, o2=3e6)
+        self.assertEqual(self._get_ranks(), [2, 3, 1])
+        # ties share their rank
+        self._give(self.employee, o2=1e6)
+        self.assertEqual(self._get_ranks(), [1, 3, 1])
+        # archived employees leave the leaderboard, the others move up
+        self.employee_3.active = False
+        self.assertEqual(self._get_ranks(), [1, 2, 0])
+        self.employee_3.active = True
+        self.assertEqual(self._get_ranks(), [1, 3, 1])
+        # the full pass agrees
+        self.env['hr.employee']._cron_refresh_leaderboard_rank()
+        self.assertEqual(self._get_ranks(), [1, 3, 1])
+
+    def test_leaderboard_top(self):
+        Employee = self.env['hr.employee']
+        self._give(self.employee, o2=1e6)
+        self.assertEqual(Employee._get_leaderboard_top()[0]['id'], self.employee.id)
+        self._give(self.employee_2, o2=2e6)
+        self.assertEqual(Employee._get_leaderboard_top()[0]['id'], self.employee_2.id)
+        self.employee_2.active = False
+        self.assertEqual(Employee._get_leaderboard_top()[0]['id'], self.employee.id)
+
+
+@tagged('post_install', '-at_install')
+class TestCSRLeaderboardPeriod(CSRCommon):
+
+    def _purchase(self, employee, activity):
+        return self.env['csr.activity.purchase'].create({
+            'activity_id': activity.id,
+            'employee_id': employee.id,
+            'xp_paid': activity.xp,
+            'o2_received': activity.value,
+        })
+
+    def test_period_totals(self):
+        department = self.env['hr.department'].create({'name': 'CSR Department'})
+        (self.employee + self.employee_2).department_id = department
+        self._give(self.employee, xp=100)
+        self._give(self.employee_2, xp=100)
+        self._purchase(self.employee, self.activity)
+        self._purchase(self.employee, self.activity)
+        purchase = self._purchase(self.employee_2, self.activity)
+
+        Totals = self.env['csr.leaderboard.period']
+        employee_ids = (self.employee + self.employee_2).ids
+        for period_type in ('week', 'month', 'quarter'):
+            top = [
+                (entry['id'], entry['purchase_count'], entry['o2_received'])
+                for entry in Totals._get_top(period_type, limit=None) if entry['id'] in employee_ids
+            ]
+            self.assertEqual(top, [(self.employee.id, 2, 10), (self.employee_2.id, 1, 5)])
+        ranking = {entry['id']: entry['o2_received'] for entry in Totals._get_department_ranking('month')}
+        self.assertEqual(ranking[department.id], 15)
+        self.assertEqual(
+            sorted(Totals.search([('employee_id', '=', self.employee.id), ('is_current', '=', True)]).mapped('period_type')),
+            ['month', 'quarter', 'week'],
+        )
+
+        # a removed purchase is taken out of its periods
+        purchase.unlink()
+        total = Totals.search([('employee_id', '=', self.employee_2.id), ('period_type', '=', 'month')])
+        self.assertRecordValues(total, [{'purchase_count': 0, 'o2_received': 0}])
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRLedger(CSRCommon):
+
+    def test_balances_follow_the_ledger(self):
+        self._give(self.employee, xp=50, o2=2.5)
+        self._give(self.employee, xp=-20)
+        self.assertEqual(self.employee.sustainability_points, 30)
+        self.assertEqual(self.employee.money_O2, 2.5)
+
+    def test_refuse_negative_xp(self):
+        self._give(self.employee, xp=10)
+        with self.assertRaises(UserError):
+            self._give(self.employee, xp=-11)
+        self.assertEqual(self.employee.sustainability_points, 10)
+
+    def test_entries_are_immutable(self):
+        entry = self._give(self.employee, xp=10)
+        with self.assertRaises(UserError):
+            entry.write({'xp_delta': 100})
+        with self.assertRaises(UserError):
+            entry.unlink()
+
+    def test_purchase_pays_through_the_ledger(self):
+        self._give(self.employee, xp=25)
+        purchase = self.env['csr.activity.purchase'].create({
+            'activity_id': self.activity.id,
+            'employee_id': self.employee.id,
+            'xp_paid': self.activity.xp,
+            'o2_received': self.activity.value,
+        })
+        self.assertEqual(self.employee.sustainability_points, 15)
+        self.assertEqual(self.employee.money_O2, 5)
+        self.assertEqual(purchase.activity_id.purchase_count, 1)
+
+    def test_purchase_batch_results(self):
+        self._give(self.employee, xp=15)
+        self._give(self.employee_2, xp=5)
+        self.activity_expensive.active = False
+        results = self.env['csr.activity.purchase']._purchase_batch([
+            (self.employee.id, self.activity.id),
+            (self.employee.id, self.activity.id),  # 5 XP left
+            (self.employee_2.id, self.activity.id),
+            (self.employee_3.id, self.activity_expensive.id),
+            (0, self.activity.id),
+        ])
+        self.assertEqual([result['success'] for result in results], [True, False, False, False, False])
+        self.assertTrue(results[0]['purchase_id'])
+        self.assertEqual(
+            [result.get('error') for result in results[1:]],
+            ['Not enough XP', 'Not enough XP', 'Unknown or inactive activity', 'Unknown employee'],
+        )
+        self.assertEqual(self.employee.sustainability_points, 5)
+        self.assertEqual(self.employee_2.sustainability_points, 5)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import io
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRNgoImport(CSRCommon):
+
+    def _import(self, kind, content, filename='import.csv'):
+        return self.env['csr.ngo.import']._import(self.ngo, kind, io.BytesIO(content.encode()), filename)
+
+    def test_import_activities(self):
+        report = self._import('activities', (
+            "Name,XP,Value,Description\n"
+            "Recycle Paper,5,2.5,Office paper\n"
+            "Fix a Bike,3,1\n"             # no trailing description cell
+            ",1,1\n"                       # no name
+            "Repair Shoes,abc,1\n"         # not a number
+            "Sell Coffee,-1,1\n"           # negative
+            ",,,\n"                        # empty rows are skipped
+        ))
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['error_count'], 3)
+        self.assertEqual([row for row, _message in report['errors']], [4, 5, 6])
+        activities = self.env['csr.activity'].search([('ngo_id', '=', self.ngo.id), ('name', 'in', ['Recycle Paper', 'Fix a Bike'])])
+        self.assertRecordValues(activities.sorted('name'), [
+            {'name': 'Fix a Bike', 'xp': 3, 'value': 1},
+            {'name': 'Recycle Paper', 'xp': 5, 'value': 2.5},
+        ])
+
+    def test_import_projects(self):
+        report = self._import('projects', (
+            "name,xp,date_start\n"
+            "Clean the River,20,2030-05-01\n"
+            "Plant Trees,10,May 1st\n"
+        ))
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'][0][0], 3)
+        project = self.env['project.project'].search([('name', '=', 'Clean the River')])
+        self.assertRecordValues(project, [{'ngo_id': self.ngo.id, 'is_sustainability': True, 'xp': 20}])
+
+    def test_import_header(self):
+        with self.assertRaisesRegex(UserError, 'Missing columns: value'):
+            self._import('activities', "name,xp\nRecycle Paper,5\n")
+        # checked on the header, even without rows
+        with self.assertRaisesRegex(UserError, 'Missing columns: value'):
+            self._import('activities', "name,xp\n")
+        self.assertEqual(self._import('activities', "name,xp,value\n")['created'], 0)
+        with self.assertRaises(UserError):
+            self._import('activities', "")
+        with self.assertRaises(UserError):
+            self._import('activities', "name,xp,value\n", filename='import.txt')
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import CSRHttpCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRPortal(CSRHttpCommon):
+
+    def test_purchase_batch(self):
+        self._give(self.employee, xp=15)
+        items = [
+            {'employee_id': self.employee.id, 'activity_id': self.activity.id},
+            {'employee_id': 'abc', 'activity_id': self.activity.id},
+            {'activity_id': self.activity.id},
+            'abc',
+            {'employee_id': self.employee.id, 'activity_id': self.activity.id},
+        ]
+        self.authenticate('csr_employee', 'csr_employee')
+        self.assertIn('error', self._call('/my/activities/purchase_batch', items=items))
+
+        self.authenticate('csr_hr', 'csr_hr')
+        results = self._call('/my/activities/purchase_batch', items=items)['result']
+        self.assertEqual([result['success'] for result in results], [True, False, False, False, False])
+        self.assertEqual(results[1]['employee_id'], 'abc')
+        self.assertEqual(results[4]['error'], 'Not enough XP')
+        self.assertEqual(self.employee.sustainability_points, 5)
+
+    def test_catalogue_conditional_get(self):
+        self._give(self.employee, xp=15)
+        self.authenticate('csr_employee', 'csr_employee')
+        response = self.url_open('/my/activities')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Plant a Tree', response.text)
+        # purchases are not shown in the shared catalogue
+        self.assertNotIn('Purchases</th>', response.text)
+        etag = response.headers['ETag']
+        self.assertEqual(self.url_open('/my/activities', headers={'If-None-Match': etag}).status_code, 304)
+
+        # the balance is part of the page
+        self._give(self.employee, xp=5)
+        self.assertEqual(self.url_open('/my/activities', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_leaderboard_json(self):
+        self._give(self.employee, o2=1e6)
+        self.authenticate('csr_employee', 'csr_employee')
+        response = self.url_open('/my/leaderboard/json?limit=1')
+        self.assertEqual(response.json()['employees'][0]['id'], self.employee.id)
+        cursor = response.json()['next_cursor']
+        response = self.url_open(f'/my/leaderboard/json?limit=1&after_o2={cursor["after_o2"]}&after_id={cursor["after_id"]}')
+        self.assertNotEqual(response.json()['employees'][0]['id'], self.employee.id)
+
+        for query in ('limit=abc', 'after_o2=abc&after_id=1', 'after_o2=1&after_id=1.5'):
+            self.assertEqual(self.url_open(f'/my/leaderboard/json?{query}').status_code, 400, query)
+
+    def test_leaderboard_period_json(self):
+        self._give(self.employee, xp=10)
+        self.env['csr.activity.purchase']._purchase_batch([(self.employee.id, self.activity.id)])
+        self.authenticate('csr_employee', 'csr_employee')
+        for period in ('week', 'month', 'quarter'):
+            response = self.url_open(f'/my/leaderboard/{period}/json?limit=100')
+            self.assertEqual(response.status_code, 200, period)
+            self.assertIn(self.employee.id, [entry['id'] for entry in response.json()['employees']], period)
+        self.assertEqual(self.url_open('/my/leaderboard/week/json?limit=abc').status_code, 400)
+
+    def test_catalogue_filters(self):
+        self._give(self.employee, xp=15)
+        self.authenticate('csr_employee', 'csr_employee')
+        response = self.url_open('/my/activities?filterby=affordable')
+        self.assertIn('Plant a Tree', response.text)
+        self.assertNotIn('Clean a Beach', response.text)
+        response = self.url_open('/my/activities?value_min=100&sortby=o2_per_xp')
+        self.assertIn('Clean a Beach', response.text)
+        self.assertNotIn('Plant a Tree', response.text)
+        response = self.url_open(f'/my/activities?ngo_id={self.other_ngo.id}')
+        self.assertNotIn('Plant a Tree', response.text)
+        # malformed values are ignored
+        self.assertEqual(self.url_open('/my/activities?value_min=abc&ngo_id=abc&sortby=abc').status_code, 200)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRProject(CSRCommon):
+
+    def _get_completion_dates(self):
+        self.env['project.project'].flush_model(['completed_by_employee_ids'])
+        self.env.cr.execute(SQL(
+            "SELECT employee_id, date FROM project_employee_completion_rel WHERE project_id = %s", self.project.id,
+        ))
+        return dict(self.env.cr.fetchall())
+
+    def test_complete_for_employees(self):
+        completed = self.project._complete_for_employees(self.employee + self.employee_3)
+        # employee_3 is not a member of the project
+        self.assertEqual(completed, self.employee)
+        self.assertEqual(self.project.completed_by_employee_ids, self.employee)
+        self.assertEqual(self.employee.sustainability_points, 30)
+
+        # nor is XP awarded twice
+        completed = self.project._complete_for_employees(self.employee + self.employee_2)
+        self.assertEqual(completed, self.employee_2)
+        self.assertEqual(self.employee.sustainability_points, 30)
+
+    def test_can_mark_done(self):
+        project = self.project.with_user(self.user_employee).sudo()
+        self.assertTrue(project.can_mark_done)
+        project.action_mark_done()
+        project.invalidate_recordset(['can_mark_done'])
+        self.assertFalse(project.can_mark_done)
+        self.assertEqual(self.employee.sustainability_points, 30)
+        # marking it again changes nothing
+        self.assertEqual(project.action_mark_done()['params']['type'], 'warning')
+        self.assertEqual(self.employee.sustainability_points, 30)
+
+    def test_mark_done_members_only(self):
+        self.employee_3.user_id = self.user_nobody
+        project = self.project.with_user(self.user_nobody).sudo()
+        self.assertFalse(project.can_mark_done)
+        with self.assertRaises(ValueError):
+            project.action_mark_done()
+
+    def test_award_queue(self):
+        self.env['ir.config_parameter'].set_param('csr_sustainability.award_mode', 'queued')
+        Queue = self.env['csr.award.queue']
+        completed = self.project._complete_for_employees(self.employee)
+        self.assertEqual(completed, self.employee)
+        # nothing but the queue is written until the cron runs...
+        self.assertFalse(self.project.completed_by_employee_ids)
+        self.assertEqual(self.employee.sustainability_points, 0)
+        self.assertFalse(self.project.with_user(self.user_employee).sudo().can_mark_done)
+        # ...and the completion is not queued twice
+        self.assertFalse(self.project._complete_for_employees(self.employee))
+        self.env.cr.execute(SQL("SELECT date FROM csr_award_queue WHERE project_id = %s", self.project.id))
+        queued_date = self.env.cr.fetchone()[0]
+
+        Queue._cron_process_queue()
+        self.assertFalse(Queue.search([]))
+        self.assertEqual(self.project.completed_by_employee_ids, self.employee)
+        self.assertEqual(self.employee.sustainability_points, 30)
+        self.assertEqual(self._get_completion_dates(), {self.employee.id: queued_date})
+
+    def test_award_queue_skips_recorded_completions(self):
+        self.env['ir.config_parameter'].set_param('csr_sustainability.award_mode', 'queued')
+        self.project._complete_for_employees(self.employee)
+        # completed meanwhile, e.g. from the backend
+        self.project.completed_by_employee_ids = [Command.link(self.employee.id)]
+        self.env['csr.award.queue']._cron_process_queue()
+        self.assertEqual(self.employee.sustainability_points, 0)
+
+    def test_participation_counters(self):
+        self.assertRecordValues(self.project, [{'participant_count': 2, 'completion_count': 0}])
+        # linking an existing participant again counts nothing
+        self.project.employee_ids = [Command.link(self.employee_3.id), Command.link(self.employee.id)]
+        self.assertEqual(self.project.participant_count, 3)
+        self.project._complete_for_employees(self.employee)
+        self.project.employee_ids = [Command.unlink(self.employee_3.id)]
+        self.assertRecordValues(self.project, [{'participant_count': 2, 'completion_count': 1, 'completion_ratio': 50}])
+        # any other change of the relations recounts them
+        self.project.employee_ids = [Command.set(self.employee.ids)]
+        self.assertRecordValues(self.project, [{'participant_count': 1, 'completion_count': 1, 'completion_ratio': 100}])
+        self.assertEqual(list(self._get_completion_dates()), [self.employee.id])
+
+    def test_completion_date_without_xp(self):
+        self.project.xp = 0
+        self.project._complete_for_employees(self.employee)
+        self.assertFalse(self.employee.points_ledger_ids)
+        self.assertTrue(self._get_completion_dates()[self.employee.id])
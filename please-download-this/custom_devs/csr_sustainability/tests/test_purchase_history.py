@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRPurchaseHistory(CSRCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._give(cls.employee, xp=100)
+        cls.purchases = cls.env['csr.activity.purchase'].create([{
+            'activity_id': cls.activity.id,
+            'employee_id': cls.employee.id,
+            'xp_paid': cls.activity.xp,
+            'o2_received': cls.activity.value,
+        } for _index in range(3)])
+        cls.Queue = cls.env['csr.activity.purchase.queue']
+        cls.Monthly = cls.env['csr.activity.purchase.monthly']
+        cls.Daily = cls.env['csr.ngo.impact.daily']
+
+    def test_purchases_are_queued(self):
+        self.assertEqual(
+            sorted(self.Queue.search([('purchase_id', 'in', self.purchases.ids)]).mapped('summary')),
+            ['impact'] * 3 + ['monthly'] * 3,
+        )
+
+    def test_rollup(self):
+        self.Monthly._rollup_purchases()
+        self.assertFalse(self.Queue.search([('summary', '=', 'monthly')]))
+        monthly = self.Monthly.search([('employee_id', '=', self.employee.id)])
+        self.assertRecordValues(monthly, [{'purchase_count': 3, 'xp_paid': 30, 'o2_received': 15}])
+        # a second run does not count them twice
+        self.Monthly._rollup_purchases()
+        self.assertEqual(monthly.purchase_count, 3)
+
+        self.purchases[0].unlink()
+        self.assertRecordValues(monthly, [{'purchase_count': 2, 'xp_paid': 20, 'o2_received': 10}])
+
+    def test_unlink_before_rollup(self):
+        self.purchases[0].unlink()
+        self.Monthly._rollup_purchases()
+        monthly = self.Monthly.search([('employee_id', '=', self.employee.id)])
+        self.assertEqual(monthly.purchase_count, 2)
+
+    def test_archive_summarized_purchases_only(self):
+        self.env['ir.config_parameter'].set_param('csr_sustainability.purchase_archive_months', 1)
+        self.purchases.purchase_date = fields.Datetime.now() - relativedelta(months=2)
+        Archive = self.env['csr.activity.purchase.archive']
+
+        Archive._archive_purchases()
+        self.assertTrue(self.purchases.exists())
+        # still left to the NGO impact
+        self.Monthly._rollup_purchases()
+        Archive._archive_purchases()
+        self.assertTrue(self.purchases.exists())
+
+        self.Daily._refresh_purchases()
+        purchase_ids = self.purchases.ids
+        Archive._archive_purchases()
+        self.assertFalse(self.purchases.exists())
+        self.assertEqual(sorted(Archive.search([('employee_id', '=', self.employee.id)]).mapped('purchase_id')), purchase_ids)
+        # archived purchases still count
+        self.employee._compute_activity_purchase_count()
+        self.assertEqual(self.employee.activity_purchase_count, 3)
+
+    def test_impact(self):
+        self.Daily._refresh_purchases()
+        daily = self.Daily.search([('ngo_id', '=', self.ngo.id)])
+        self.assertRecordValues(daily, [{'activity_id': self.activity.id, 'purchase_count': 3, 'o2_received': 15}])
+        reach = self.env['csr.ngo.impact.reach'].search([('ngo_id', '=', self.ngo.id)])
+        self.assertRecordValues(reach, [{'employee_id': self.employee.id, 'purchase_count': 3}])
+        self.Daily._refresh_purchases()
+        self.assertEqual(daily.purchase_count, 3)
+
+    def test_impact_projects(self):
+        Snapshot = self.env['csr.ngo.impact.project']
+        Snapshot._refresh_projects()
+        self.assertFalse(self.env['csr.ngo.impact.project.queue'].search([]))
+        snapshot = Snapshot.search([('project_id', '=', self.project.id)])
+        self.assertRecordValues(snapshot, [{'ngo_id': self.ngo.id, 'participant_count': 2, 'completion_count': 0}])
+
+        self.project._complete_for_employees(self.employee)
+        Snapshot._refresh_projects()
+        self.assertEqual(snapshot.completion_count, 1)
+
+        self.project.is_sustainability = False
+        Snapshot._refresh_projects()
+        self.assertFalse(snapshot.exists())
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import new_test_user, tagged
+
+from .common import CSRCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCSRIdentity(CSRCommon):
+
+    def test_identity(self):
+        self.assertEqual(self.user_employee._get_csr_identity(), (self.env['csr.ngo'], self.employee))
+        self.assertEqual(self.user_ngo._get_csr_identity(), (self.ngo, self.env['hr.employee']))
+        self.assertEqual(self.user_nobody._get_csr_identity(), (self.env['csr.ngo'], self.env['hr.employee']))
+
+    def test_identity_follows_the_links(self):
+        self.assertFalse(self.user_nobody._get_csr_identity()[1])
+        self.employee_2.user_id = self.user_nobody
+        self.assertEqual(self.user_nobody._get_csr_identity()[1], self.employee_2)
+        self.ngo.user_id = self.user_other_ngo
+        self.assertEqual(self.user_ngo._get_csr_identity()[0], self.env['csr.ngo'])
+
+    def test_identity_name_fallback(self):
+        user = new_test_user(self.env, login='csr_named', name='CSR Employee 3', groups='base.group_user')
+        self.assertFalse(user._get_csr_identity()[1])
+        self.assertEqual(user._get_csr_identity(match_name=True)[1], self.employee_3)
+        self.employee_3.name = 'CSR Renamed'
+        self.assertFalse(user._get_csr_identity(match_name=True)[1])
@@ -1,3 +1,3 @@
 from . import join_project_wizard
 from . import purchase_activity_wizard
-
+from . import complete_project_wizard
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, fields, models
+
+
+class CompleteProjectWizard(models.TransientModel):
+    _name = 'csr.complete.project.wizard'
+    _description = 'Wizard to Complete a Sustainability Project for Participants'
+
+    project_id = fields.Many2one(
+        'project.project',
+        string='Project',
+        required=True,
+        domain=[('is_sustainability', '=', True)]
+    )
+    pending_employee_ids = fields.Many2many(
+        'hr.employee',
+        string='Pending Participants',
+        compute='_compute_pending_employee_ids'
+    )
+    employee_ids = fields.Many2many(
+        'hr.employee',
+        string='Participants',
+        help='Participants the project is marked as done for'
+    )
+
+    @api.depends('project_id')
+    def _compute_pending_employee_ids(self):
+        for wizard in self:
+            project = wizard.project_id.sudo()
+            wizard.pending_employee_ids = project.employee_ids - project.completed_by_employee_ids
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super(CompleteProjectWizard, self).default_get(fields_list)
+        
+        # Set project from context and select all its pending participants
+        if 'project_id' in fields_list and not res.get('project_id'):
+            if self.env.context.get('active_id') and self.env.context.get('active_model') == 'project.project':
+                res['project_id'] = self.env.context.get('active_id')
+        if 'employee_ids' in fields_list and res.get('project_id'):
+            project = self.env['project.project'].sudo().browse(res['project_id'])
+            res['employee_ids'] = (project.employee_ids - project.completed_by_employee_ids).ids
+        
+        return res
+
+    def action_complete(self):
+        """Mark the project as done for the selected participants and award XP"""
+        self.ensure_one()
+        employees = self.project_id._complete_for_employees(self.employee_ids)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Success'),
+                'message': _('Project marked as done for %s participant(s).', len(employees)),
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
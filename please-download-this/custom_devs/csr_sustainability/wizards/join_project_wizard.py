@@ -23,17 +23,10 @@ class JoinProjectWizard(models.TransientModel):
     def default_get(self, fields_list):
         """Override default_get to ensure employee is always set for the current user"""
         res = super(JoinProjectWizard, self).default_get(fields_list)
-        user = self.env.user
         
-        # Try to find employee linked to user
-        # Use sudo() to bypass access restrictions when searching for employee
+        # Try to find employee linked to user, falling back on name matching
         if 'employee_id' in fields_list:
-            employee = self.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
-            if not employee:
-                # Try to find by name matching
-                employee = self.env['hr.employee'].sudo().search([
-                    ('name', 'ilike', user.name)
-                ], limit=1)
+            employee = self.env.user._get_csr_identity(match_name=True)[1]
             if employee:
                 res['employee_id'] = employee.id
         
@@ -40,7 +40,6 @@ class PurchaseActivityWizard(models.TransientModel):
     @api.model
     def default_get(self, fields_list):
         res = super(PurchaseActivityWizard, self).default_get(fields_list)
-        user = self.env.user
         
         # Get activity from context
         if 'activity_id' in fields_list and not res.get('activity_id'):
@@ -49,11 +48,7 @@ class PurchaseActivityWizard(models.TransientModel):
         
         # Get employee for current user
         if 'employee_id' in fields_list:
-            employee = self.env['hr.employee'].sudo().search([('user_id', '=', user.id)], limit=1)
-            if not employee:
-                employee = self.env['hr.employee'].sudo().search([
-                    ('name', 'ilike', user.name)
-                ], limit=1)
+            employee = self.env.user._get_csr_identity(match_name=True)[1]
             if employee:
                 res['employee_id'] = employee.id
         
@@ -68,20 +63,14 @@ class PurchaseActivityWizard(models.TransientModel):
                 self.xp_cost, self.current_xp
             ))
         
-        # Create purchase record
-        purchase = self.env['csr.activity.purchase'].sudo().create({
+        # Create purchase record, its ledger entry updates the employee's XP and O2
+        self.env['csr.activity.purchase'].sudo().create({
             'activity_id': self.activity_id.id,
             'employee_id': self.employee_id.id,
             'xp_paid': self.xp_cost,
             'o2_received': self.o2_value,
         })
         
-        # Update employee's XP (sustainability_points) and O2 (money_O2)
-        self.employee_id.sudo().write({
-            'sustainability_points': self.employee_id.sustainability_points - self.xp_cost,
-            'money_O2': (self.employee_id.money_O2 or 0) + self.o2_value,
-        })
-        
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Entrypoint of the replica: clone the primary on first start, then run
+# PostgreSQL as a hot standby following it.
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until PGPASSWORD="$REPLICATION_PASSWORD" pg_basebackup --host=db --username=replicator \
+            --pgdata="$PGDATA" --wal-method=stream --write-recovery-conf --checkpoint=fast; do
+        echo "Waiting for the primary database..."
+        rm -rf "${PGDATA:?}"/*
+        sleep 2
+    done
+    chmod 700 "$PGDATA"
+fi
+
+exec postgres